@@ -1,27 +1,90 @@
 # Updated Streamlit app to reflect new content structure and clean errors
 import streamlit as st
 import pandas as pd
-import openai
-from dotenv import load_dotenv
-import os
+import hashlib
 import json
+import os
 
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+import export
+import generation
+import jobs
+import kld
+import token_budget
+import variants
+from prompts import (HERO_BRANDS, SECTION_NAMES, SECTIONS, build_prompt, inputs_fingerprint, section_inputs,
+                     unsupported_reason)
+from web_content import WEB_SECTIONS, format_web_full
 
 st.set_page_config(page_title="Product Listing Automation", layout="wide")
 st.title("🧠 Product Listing Automation Tool")
 
+with st.sidebar:
+    st.subheader("🗄️ Response Cache")
+    cache_stats = generation.cache.stats()
+    hits_col, misses_col = st.columns(2)
+    hits_col.metric("Hits", cache_stats['hits'])
+    misses_col.metric("Misses", cache_stats['misses'])
+    st.caption(f"{cache_stats['entries']} cached responses, {cache_stats['bytes'] / 1024:.0f} KB")
+    if st.button("Clear Cache"):
+        generation.cache.clear()
+
+    st.subheader("📊 LLM Metrics")
+    section_metrics = generation.metrics.section_summary()
+    if section_metrics:
+        st.caption("Per section (latency in seconds, uncached calls only)")
+        st.dataframe(pd.DataFrame(section_metrics).set_index('section').round(4), use_container_width=True)
+        st.caption("Per SKU")
+        st.dataframe(pd.DataFrame(generation.metrics.sku_summary()).set_index('sku').round(4), use_container_width=True)
+        st.download_button("Prometheus Metrics", data=generation.metrics.to_prometheus(),
+                           file_name="llm_metrics.prom", mime="text/plain")
+        st.download_button("Call Log (JSONL)", data=generation.metrics.to_jsonl(),
+                           file_name="llm_calls.jsonl", mime="application/jsonl")
+    else:
+        st.caption("No LLM calls yet.")
+    prompt_savings = token_budget.savings_report()
+    if prompt_savings:
+        saved = sum(row['saved'] for row in prompt_savings)
+        trimmed = sum(row['trimmed'] for row in prompt_savings)
+        st.caption(f"✂️ Prompt inputs: {saved} tokens saved by compaction, {trimmed} prompts trimmed to "
+                   f"the {token_budget.DEFAULT_INPUT_BUDGET}-token budget")
+
+
+@st.cache_data(show_spinner="Reading KLD sheet...", max_entries=8)
+def load_kld(content_hash, name, _data):
+    # Keyed on the content hash only, so every rerun reuses the parsed frame
+    return kld.read_kld(_data, name)
+
+
+@st.cache_resource
+def job_store():
+    # Opened once per process instead of re-running the schema setup on every rerun
+    return jobs.JobStore()
+
+
+@st.fragment(run_every=1.0)
+def zip_progress(path):
+    # Polls the background export without rerunning the whole page
+    zip_job = export.zip_export(path)
+    if zip_job.finished:
+        # The page rerun that follows offers the download straight away
+        st.session_state['zip_ready'] = path
+        st.rerun()
+    st.progress(zip_job.written / max(zip_job.total, 1),
+                text=f"Building ZIP: {zip_job.written}/{zip_job.total} products")
+
+
 st.subheader("📥 Upload KLD Sheet")
-uploaded_file = st.file_uploader("Upload your KLD Excel file", type=["xlsx"])
+uploaded_file = st.file_uploader("Upload your KLD sheet (Excel, CSV or Parquet)", type=kld.KLD_FILE_TYPES)
 
 if uploaded_file:
-    df = pd.read_excel(uploaded_file)
-    df.columns = df.columns.str.strip()
+    data = uploaded_file.getvalue()
+    content_hash = hashlib.sha256(data).hexdigest()
+    df = load_kld(content_hash, uploaded_file.name, data)
     st.success("KLD sheet loaded successfully!")
 
     if 'Product Name' in df.columns:
         product_info = df.iloc[0]
+        sku = generation.product_sku(product_info, 0)
 
         st.subheader("🔹 Product Information")
         product_table = {
@@ -38,405 +101,153 @@ if uploaded_file:
         }
         st.table(pd.DataFrame(product_table.items(), columns=["Field", "Value"]))
 
-        def generate_section(section_name, instruction):
+        # Fingerprint of the KLD fields each generated section was built from
+        generated_inputs = st.session_state.setdefault('generated_inputs', {})
+
+        def inputs_for(key, structured_web=False):
+            return inputs_fingerprint(key, section_inputs(key, product_info, structured_web), structured_web)
+
+        def remember_inputs(key, structured_web=False):
+            generated_inputs[key] = (inputs_for(key, structured_web), structured_web)
+
+        def changed_sections():
+            return [key for key, (fingerprint, structured_web) in generated_inputs.items()
+                    if fingerprint != inputs_for(key, structured_web)]
+
+        def stream_section(key, instruction, use_cache=True):
+            # Text is committed to session state chunk by chunk, so a cancelled
+            # stream keeps what was generated so far.
+            stop = st.empty()
+            stop.button("⏹ Stop", key=f"stop_{key}", help="Cancel this generation and keep the text so far")
+            output = st.empty()
+            st.session_state[key] = ''
+            chunks = generation.stream_section(instruction, use_cache, section=key, sku=sku)
             try:
-                completion = openai.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": "You are a professional ecommerce copywriter."},
-                        {"role": "user", "content": instruction}
-                    ],
-                    temperature=0.7
-                )
-                return completion.choices[0].message.content.strip()
+                for chunk in chunks:
+                    st.session_state[key] += chunk
+                    output.markdown(st.session_state[key] + "▌")
             except Exception as e:
-                st.error(f"Error generating {section_name}: {e}")
-                return ""
+                st.error(f"Error generating {SECTION_NAMES[key]}: {e}")
+            finally:
+                # Also runs when the Stop click interrupts the script, closing the API stream
+                chunks.close()
+            st.session_state[key] = st.session_state[key].strip()
+            remember_inputs(key)
+            output.empty()
+            stop.empty()
 
         def text_box(label, key, height):
             if key in st.session_state:
                 st.text_area(label, st.session_state[key], height=height)
 
+        def section(key, button, label, height):
+            st.session_state.setdefault(key, '')
+            generate_col, regenerate_col = st.columns([3, 1])
+            clicked = generate_col.button(button)
+            regenerate = regenerate_col.button("♻️ Regenerate", key=f"regenerate_{key}", help="Bypass the cache")
+            if (clicked or regenerate) and unsupported_reason(key, product_info):
+                st.warning(unsupported_reason(key, product_info))
+            elif clicked or regenerate:
+                stream_section(key, build_prompt(key, product_info), use_cache=not regenerate)
+            text_box(label, key, height)
+
+        def generate_sections(sections, use_cache=True):
+            status = st.empty()
+            finished = []
+
+            # Sections with no prompt for this product are noted, not sent
+            for key in [key for key in sections if unsupported_reason(key, product_info)]:
+                st.info(f"{SECTION_NAMES[key]} skipped: {unsupported_reason(key, product_info)}")
+            sections = [key for key in sections if not unsupported_reason(key, product_info)]
+
+            def on_result(section, text, error):
+                st.session_state[section] = text
+                if error:
+                    st.error(f"Error generating {SECTION_NAMES[section]}: {error}")
+                else:
+                    remember_inputs(section)
+                finished.append(SECTION_NAMES[section])
+                status.info(f"Finished {len(finished)}/{len(sections)}: {', '.join(finished)}")
+
+            with st.spinner("Generating sections..."):
+                generation.generate_all_sections(product_info, sections, on_result=on_result, use_cache=use_cache,
+                                                 sku=sku)
+            status.success(f"Generated {len(finished)} sections.")
+
+        def generate_web_content(sections=WEB_SECTIONS, use_cache=True):
+            # One structured call fills the website sections; invalid sections are re-requested on their own
+            try:
+                with st.spinner("Generating website content..."):
+                    web_texts, web_problems, _ = generation.generate_web_sections(product_info, sections,
+                                                                                    use_cache=use_cache, sku=sku)
+                st.session_state.update(web_texts)
+                st.session_state['web_full'] = format_web_full(
+                    {web_section: st.session_state[web_section] for web_section in WEB_SECTIONS
+                     if st.session_state.get(web_section)})
+                for web_section in web_texts:
+                    remember_inputs(web_section, structured_web=True)
+                remember_inputs('web_full')
+                for web_section, problem in web_problems.items():
+                    st.warning(f"{SECTION_NAMES[web_section]} still fails validation: {problem}")
+            except Exception as e:
+                st.error(f"Error generating {SECTION_NAMES['web_full']}: {e}")
+
+        generate_all_col, bypass_col = st.columns([3, 1])
+        bypass_cache = bypass_col.checkbox("Bypass cache", help="Regenerate every section instead of reusing cached responses")
+        if generate_all_col.button("⚡ Generate All Sections"):
+            generate_sections(SECTIONS, use_cache=not bypass_cache)
+
+        # Only sections whose KLD inputs differ from what they were generated from need another call
+        stale = changed_sections()
+        if stale:
+            stale_notice = st.empty()
+            with stale_notice.container():
+                st.warning(f"{len(stale)} sections were generated from different KLD values: "
+                           f"{', '.join(SECTION_NAMES[key] for key in stale)}")
+                regenerate_stale = st.button("🔁 Regenerate Changed Sections")
+            if regenerate_stale:
+                stale_notice.empty()
+                # Website sections from the structured call go back through it together, not as a prompt each
+                structured = [key for key in stale if key in WEB_SECTIONS and generated_inputs[key][1]]
+                if structured or 'web_full' in stale:
+                    generate_web_content(structured or WEB_SECTIONS)
+                others = [key for key in stale if key not in structured and key != 'web_full']
+                if others:
+                    generate_sections(others)
+
         # Amazon Content Generation
-        st.session_state.setdefault('title', '')
-        if st.button("Generate Product Title"):
-            title_prompt = f"""
-Write an Amazon product title (max 200 characters) for a high-converting listing.
-Use this format: Brand + Product Type + Keywords + Claims.
-Do not include size, weight, or volume in the title.
-
-Product: {product_info['Product Name']}
-Brand: {product_info['Brand Name']}
-USPs: {product_info['USPs Front']}
-Ingredients: {product_info['Ingredients']}
-Claims: {product_info['Claims']}
-"""
-            st.session_state['title'] = generate_section("title", title_prompt)
-        text_box("Amazon Product Title", 'title', 100)
+        section('title', "Generate Product Title", "Amazon Product Title", 100)
         st.subheader("🛒 Amazon Content")
-        st.session_state.setdefault('bullets', '')
-        if st.button("Generate Bullet Points"):
-            bullet_prompt = f"""
-Write 7 optimized Amazon bullet points. Each bullet should follow this format:
-BENEFIT IN CAPS: Followed by a clear, compelling benefit (250–300 characters).
-
-Avoid mentioning price, value for money, discounts, or any numerical cost-related details. Focus only on features, results, usage, or ingredient benefits.
-
-Product: {product_info['Product Name']}
-Brand: {product_info['Brand Name']}
-USPs: {product_info['USPs Front']}
-Ingredients: {product_info['Ingredients']}
-Claims: {product_info['Claims']}
-How to Use: {product_info['How to use it?']}
-Pack Contains: {product_info['Particulars']}
-MRP: ₹{product_info['MRP']}
-            """
-            st.session_state['bullets'] = generate_section("bullet points", bullet_prompt)
-        text_box("Generated Bullet Points", 'bullets', 200)
-
-        st.session_state.setdefault('description', '')
-        if st.button("Generate Description"):
-            desc_prompt = f"""
-Write an Amazon HTML product description (max 400 words).
-Use 2 paragraphs, <p> and <br> tags for light formatting.
-
-Product: {product_info['Product Name']}
-Brand: {product_info['Brand Name']}
-USPs: {product_info['USPs Front']}
-Ingredients: {product_info['Ingredients']}
-Claims: {product_info['Claims']}
-How to Use: {product_info['How to use it?']}
-            """
-            st.session_state['description'] = generate_section("description", desc_prompt)
-        text_box("HTML Description", 'description', 150)
-
-        st.session_state.setdefault('shopify', '')
-        if st.button("Generate Shopify Description"):
-            shopify_prompt = f"""
-Write a Shopify product description using a friendly, informative tone.
-Include small paragraphs, bullet points, and headings. Length: 1500–2000 characters.
-
-Product: {product_info['Product Name']}
-Brand: {product_info['Brand Name']}
-USPs: {product_info['USPs Front']}
-Ingredients: {product_info['Ingredients']}
-Claims: {product_info['Claims']}
-How to Use: {product_info['How to use it?']}
-Pack Contains: {product_info['Particulars']}
-MRP: ₹{product_info['MRP']}
-            """
-            st.session_state['shopify'] = generate_section("Shopify description", shopify_prompt)
-        text_box("Shopify Description", 'shopify', 200)
-
-        st.session_state.setdefault('hero', '')
-        if st.button("Generate Hero Prompts"):
-            if product_info['Brand Name'] == "Urbanyog":
-                hero_prompt = f"""
-                    Generate a series of 7 hero image prompts for a beauty product, each designed to be a standalone visual in the following sequence.  
-                    Each image must be exactly 1500 x 1500 pixels. For each image, include specific visual/creative directions as outlined.
-
-                    1. Hero Image: What does it do / Differentiation / Before-After  
-                    - Show the product with a clear before-and-after comparison, highlighting the main benefit or transformation.  
-                    - Use high-resolution, professional imagery with a clean, softly colored, on-brand background.  
-                    - Overlay concise benefit-driven text or icons.  
-                    - Ensure the product is the main focal point.
-
-                    2. USP  
-                    - Focus on the unique selling proposition that sets this product apart.  
-                    - Use bold text or a badge to highlight the USP.  
-                    - Incorporate lifestyle or in-use imagery for emotional connection.
-
-                    3. Ingredients & Their Use  
-                    - Visually showcase key ingredients with small icons or illustrations.  
-                    - Briefly mention each ingredient’s benefit.  
-                    - Use a soft, inviting color palette.
-
-                    4. Science Behind USP  
-                    - Include science-related visuals (molecules, lab glassware, dermatologist icons) to reinforce efficacy.  
-                    - Overlay a short, clear explanation of the science behind the USP.
-
-                    5. Comparison / Do's and Don'ts  
-                    - Create a side-by-side comparison with alternatives or a clear Do’s and Don’ts visual.  
-                    - Use simple icons and minimal text for clarity.
-
-                    6. How to Use  
-                    - Present step-by-step usage instructions in 3–4 crisp, numbered icons or steps.  
-                    - Keep instructions short, clear, and visually engaging.
-
-                    7. Safe for All Hair/Skin Types  
-                    - Use icons or imagery showing diversity in models (different skin/hair types).  
-                    - Add a clear statement or badge indicating suitability for all.
-
-                    General Visual/Creative Directions for All Images:  
-                    - Each image must be exactly 1500 x 1500 pixels.  
-                    - Use high-resolution, professional images.  
-                    - Clean, uncluttered, on-brand backgrounds.  
-                    - Overlay concise, benefit-driven text or icons.  
-                    - Maintain a consistent style, color palette, and font across all images.  
-                    - Optimize for both desktop and mobile screens.  
-                    - Avoid clutter; keep visuals focused and easy to scan.  
-                    - Do not include any call-to-action (CTA) buttons.  
-                    - Include relevant props that complement the product and provide context, without distracting from the main subject.  
-                    - Feature models where appropriate, ensuring diversity in skin and hair types to show inclusivity and real-world results.  
-                    - Use professional lighting setups (such as three-point lighting, softboxes, umbrellas, or ring lights) for soft, even illumination and to minimize harsh shadows.  
-                    - Capture the product from optimal angles, including close-ups for detail and lifestyle shots for context.  
-                    - Ensure the product is always the main focal point, with props and models used to enhance the story.
-
-                    Product details:  
-                    Product: {product_info['Product Name']}  
-                    USP: {product_info['USPs Front']}  
-                    Ingredients: {product_info['Ingredients']}  
-                    How to use: {product_info['How to use it?']}  
-                    Target: {product_info.get('Target Audience', '')}  
-                    Other details: {product_info.get('Other details', '')}
-                    """
-            elif product_info['Brand Name'] == "MakeMeeBold":
-                hero_prompt = f"""
-                Generate a series of 7 hero image prompts for an electronics product, each designed to be a standalone visual in the following sequence.  
-                Each image must be exactly 1500 x 1500 pixels. For each image, include specific visual/creative directions as outlined.
-
-                1. Hero Image: What does it do / Differentiation / Before-After  
-                - Show the product in action or with a before-and-after or comparison visual.  
-                - Use high-resolution, professional imagery with a clean, on-brand background.  
-                - Overlay concise benefit-driven text or icons.
-
-                2. Main USP  
-                - Highlight the primary unique selling point with bold text or a badge.  
-                - Use dynamic angles and close-ups to draw attention.
-
-                3. Other USPs  
-                - Present additional USPs or features with icons or short text.  
-                - Arrange features for easy scanning.
-
-                4. Comparison  
-                - Create a side-by-side comparison with other products or brands.  
-                - Use simple graphics and minimal text.
-
-                5. How to Use  
-                - Show 2–4 easy-to-follow steps or icons for product usage.  
-                - Keep instructions short and visually engaging.
-
-                6. All Hair Type (if relevant)  
-                - Use a badge or icon to indicate compatibility with all hair types (for grooming devices).  
-                - Show diverse models if applicable.
-
-                7. What's in the Box / Customer Care  
-                - Display all included accessories in a neat flat-lay or organized arrangement.  
-                - Add customer care contact or warranty info in a clear, non-intrusive way.
-
-                General Visual/Creative Directions for All Images:  
-                - Each image must be exactly 1500 x 1500 pixels.  
-                - Use high-resolution, professional images.  
-                - Clean, uncluttered, on-brand backgrounds.  
-                - Overlay concise, benefit-driven text or icons.  
-                - Consistent style, color palette, and font across all images.  
-                - Optimize for both desktop and mobile screens.  
-                - Avoid clutter; keep visuals focused and easy to scan.  
-                - Do not include any call-to-action (CTA) buttons.  
-                - Include relevant props that complement the product and provide context, without distracting from the main subject.  
-                - Feature models where appropriate (e.g., for scale or lifestyle context).  
-                - Use professional lighting setups (such as three-point lighting, softboxes, umbrellas, or ring lights) for soft, even illumination and to minimize harsh shadows.  
-                - Capture the product from optimal angles, including close-ups for detail and lifestyle shots for context.  
-                - Ensure the product is always the main focal point, with props and models used to enhance the story.
-
-                Product details:  
-                Product: {product_info['Product Name']}  
-                Main USP: {product_info['USPs Front']}  
-                Other USPs: {product_info.get('Other USPs', '')}  
-                How to use: {product_info['How to use it?']}  
-                Box contents: {product_info.get('Particulars', '')}  
-                Customer care: {product_info.get('Customer Care', '')}  
-                Other details: {product_info.get('Other details', '')}
-                """
-            else:
-                hero_prompt = "Category not supported. Please specify 'beauty' or 'electronics' in the product info."
-
-            st.session_state['hero'] = generate_section("hero image prompts", hero_prompt)
-        text_box("Hero Image Prompts", 'hero', 180)
-
-        st.session_state.setdefault('a_plus', '')
-        if st.button("Generate A+ Prompts"):
-            a_plus_prompt = f"""
-Generate 7 Amazon A+ content image prompts in this format:
-
-Image 1:
-• Visual: 1464x600 (desktop) / 600x450 (mobile). Clean layout, brand, benefits.
-• Text: Marketing headline
-• Supporting Text: Short supporting copy
-
-Product: {product_info['Product Name']}
-USPs: {product_info['USPs Front']}
-How to Use: {product_info['How to use it?']}
-Claims: {product_info['Claims']}
-Ingredients: {product_info['Ingredients']}
-            """
-            st.session_state['a_plus'] = generate_section("A+ image prompts", a_plus_prompt)
-        text_box("A+ Image Prompts", 'a_plus', 180)
+        section('bullets', "Generate Bullet Points", "Generated Bullet Points", 200)
+        section('description', "Generate Description", "HTML Description", 150)
+        section('shopify', "Generate Shopify Description", "Shopify Description", 200)
+        section('hero', "Generate Hero Prompts", "Hero Image Prompts", 180)
+        section('a_plus', "Generate A+ Prompts", "A+ Image Prompts", 180)
 
         # Website Content Generation
-        if st.button("🧠 Generate Full Website Content"):
-            full_web_prompt = f"""
-Generate the following website content in a structured format:
-
-1. 7 Bullet Points – focus on customer benefits, pain points, or product uniqueness.
-2. Description – 2 paragraphs, warm and benefit-driven tone, max 400 words.
-3. USP Points – concise value-driven phrases (2–4 words each).
-4. What do you get – brief explanation of what comes in the package.
-5. How to use – easy-to-follow, friendly, step-by-step instructions.
-6. 6 FAQs – with short, helpful answers.
-7. 15 Customer Reviews – first 2 as story-style testimonials, remaining 13 as short user opinions.
-
-Product Name: {product_info['Product Name']}
-Brand: {product_info['Brand Name']}
-USPs / Features: {product_info['USPs Front']}
-Ingredients: {product_info['Ingredients']}
-Claims: {product_info['Claims']}
-How to Use: {product_info['How to use it?']}
-What’s Included: {product_info['Particulars']}
-MRP: ₹{product_info['MRP']}
-            """
-            web_full = generate_section("Website Content", full_web_prompt)
-            st.session_state['web_full'] = web_full
+        web_full_col, web_full_regenerate_col = st.columns([3, 1])
+        web_full_clicked = web_full_col.button("🧠 Generate Full Website Content")
+        web_full_regenerate = web_full_regenerate_col.button("♻️ Regenerate", key="regenerate_web_full", help="Bypass the cache")
+        if web_full_clicked or web_full_regenerate:
+            generate_web_content(use_cache=not web_full_regenerate)
         text_box("Full Website Content", 'web_full', 500)
         st.subheader("🌐 Website Content")
 
-        st.session_state.setdefault('web_bullets', '')
-        if st.button("Generate Website Bullet Points"):
-            web_bullet_prompt = f"""
-Write 7 bullet points for website use. Each point should focus on product benefits, customer problems, or emotional triggers.
-
-Product: {product_info['Product Name']}
-USPs: {product_info['USPs Front']}
-"""
-            st.session_state['web_bullets'] = generate_section("website bullets", web_bullet_prompt)
-        text_box("Website Bullet Points", 'web_bullets', 200)
-
-        st.session_state.setdefault('web_description', '')
-        if st.button("Generate Website Description"):
-            web_desc_prompt = f"""
-Write a product description for the website (max 400 words). Use a warm, benefit-oriented tone and structure it with two paragraphs.
-
-Product: {product_info['Product Name']}
-USPs: {product_info['USPs Front']}
-Claims: {product_info['Claims']}
-Ingredients: {product_info['Ingredients']}
-"""
-            st.session_state['web_description'] = generate_section("website description", web_desc_prompt)
-        text_box("Website Description", 'web_description', 200)
-
-        st.session_state.setdefault('usp', '')
-        if st.button("Generate USP"):
-            usp_prompt = f"""
-Generate exactly 6 concise USPs for a product listing.
-Guidelines:
-- Each USP must be a short, impactful phrase of 2–4 words.
-- Do not include full sentences.
-- Do not include explanations.
-- Format strictly as a bullet list like:
-  - Frizz-control Formula
-  - Lightweight & Non-Greasy
-  - Safe for Daily Use
-
-Product: {product_info['Product Name']}
-USPs: {product_info['USPs Front']}
-"""
-            st.session_state['usp'] = generate_section("USP", usp_prompt)
-        text_box("USP", 'usp', 100)
-
-        st.session_state.setdefault('what_you_get', '')
-        if st.button("Generate 'What Do You Get'"):
-            get_prompt = f"""
-Describe what the customer will receive when they purchase the product. Mention packaging, quantity, and any bonuses.
-
-Product: {product_info['Product Name']}
-"""
-            st.session_state['what_you_get'] = generate_section("What Do You Get", get_prompt)
-        text_box("What Do You Get", 'what_you_get', 100)
-
-        st.session_state.setdefault('how_to_use', '')
-        if st.button("Generate 'How to Use'"):
-            how_to_prompt = f"""
-Describe how to use this product step-by-step in a friendly, instructional tone.
-
-Product: {product_info['Product Name']}
-Instructions: {product_info['How to use it?']}
-"""
-            st.session_state['how_to_use'] = generate_section("How to Use", how_to_prompt)
-        text_box("How to Use This", 'how_to_use', 100)
-
-        st.session_state.setdefault('faqs', '')
-        if st.button("Generate FAQs"):
-            faqs_prompt = f"""
-Write 6 frequently asked questions and concise answers for this Amazon product listing.
-Guidelines:
-- Do NOT include questions about certifications, result timelines, or return/refund policies.
-- Avoid questions like "What is it?" or "How do I use it?" since those are covered elsewhere.
-- Focus on practical use, compatibility, safety (general, not certifications), storage, frequency, product care, and common customer concerns.
-- Keep answers under 150 characters.
-- Use clear, customer-friendly language.
-- Naturally include relevant keywords where possible, but do not keyword stuff.
-- Do not mention price, promotions, or other brands.
-
-Product: {product_info['Product Name']}
-Key Features: {product_info['USPs Front']}
-Ingredients: {product_info['Ingredients']}
-How to Use: {product_info['How to use it?']}
-
-"""
-            st.session_state['faqs'] = generate_section("FAQs", faqs_prompt)
-        text_box("FAQs", 'faqs', 200)
-
-        st.session_state.setdefault('reviews', '')
-        if st.button("Generate Reviews"):
-            review_prompt = f"""
-Write 15 customer reviews for this product.
-- The first 2 should be long story-style testimonials.
-- The remaining 13 should be short, specific, and highlight different use cases or outcomes.
-- All reviewer names should sound authentic and be common Indian names.
-
-Product: {product_info['Product Name']}
-"""
-            st.session_state['reviews'] = generate_section("Reviews", review_prompt)
-        text_box("Customer Reviews", 'reviews', 300)
+        section('web_bullets', "Generate Website Bullet Points", "Website Bullet Points", 200)
+        section('web_description', "Generate Website Description", "Website Description", 200)
+        section('usp', "Generate USP", "USP", 100)
+        section('what_you_get', "Generate 'What Do You Get'", "What Do You Get", 100)
+        section('how_to_use', "Generate 'How to Use'", "How to Use This", 100)
+        section('faqs', "Generate FAQs", "FAQs", 200)
+        section('reviews', "Generate Reviews", "Customer Reviews", 300)
 
         # Export or clear
         if st.button("📥 Download Output as Word"):
-            import docx
-            from docx.shared import Pt
-            from io import BytesIO
-
-            doc = docx.Document()
-            doc.add_heading(f"Product Listing Content – {product_info['Product Name']}", 0)
-
-            sections = [
-                ('Amazon Bullet Points', 'bullets'),
-                ('Amazon Description', 'description'),
-                ('Shopify Description', 'shopify'),
-                ('Hero Image Prompts', 'hero'),
-                ('A+ Image Prompts', 'a_plus'),
-                ('Website Bullet Points', 'web_bullets'),
-                ('Website Description', 'web_description'),
-                ('USP', 'usp'),
-                ('What Do You Get', 'what_you_get'),
-                ('How to Use', 'how_to_use'),
-                ('FAQs', 'faqs'),
-                ('Customer Reviews', 'reviews')
-            ]
-
-            for title, key in sections:
-                content = st.session_state.get(key, '')
-                if content:
-                    doc.add_heading(title, level=1)
-                    doc.add_paragraph(content, style='Normal')
-
-            buffer = BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
             st.download_button(
                 label="Download Word Document",
-                data=buffer,
+                data=export.listing_docx(product_info['Product Name'], st.session_state),
                 file_name="product_listing.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                mime=export.DOCX_MIME
             )
         if st.button("🧹 Clear All"):
             for key in ['bullets', 'description', 'shopify', 'hero', 'a_plus', 'web_bullets', 'web_description', 'usp', 'what_you_get', 'how_to_use', 'faqs', 'reviews', 'web_full']:
@@ -447,6 +258,70 @@ Product: {product_info['Product Name']}
             json_str = json.dumps(output, indent=2)
             st.download_button("Download JSON", data=json_str, file_name="listing_content.json", mime="application/json")
 
+        # Batch mode: every row of the sheet, not just the first product
+        st.subheader("📦 Batch Mode")
+        products = df.dropna(subset=['Product Name'])
+        st.caption(f"{len(products)} products in this sheet.")
+        max_in_flight = st.number_input("Max concurrent requests", min_value=1, max_value=64,
+                                        value=generation.DEFAULT_MAX_IN_FLIGHT)
+        structured_web = st.checkbox("Website sections in one structured call per product", value=True)
+        derive_variants = st.checkbox("Derive variants (same product in another size or pack) from one generation",
+                                      value=True)
+        variant_threshold = variants.DEFAULT_THRESHOLD if derive_variants else None
+        # Batch runs live in the job store, so a reload or a crash resumes instead of starting over
+        job_id = jobs.job_id_for(content_hash, SECTIONS, structured_web, variant_threshold)
+        job_progress = job_store().progress(job_id)
+        if job_progress['total']:
+            st.caption(f"Saved job {job_id}: {job_progress.get('done', 0)}/{job_progress['total']} sections done, "
+                       f"{job_progress.get('failed', 0)} failed, {job_progress.get('skipped', 0)} skipped.")
+        if st.button("🚀 Generate All Products"):
+            job_summary = job_store().create_job(products, SECTIONS, job_id, structured_web, variant_threshold)
+            if job_summary['variants']:
+                st.info(f"{job_summary['variants']} sections of variant products will be derived instead of generated.")
+            if job_summary['reused']:
+                changed = ", ".join(f"{field} ({count})" for field, count in job_summary['changed_fields'].items())
+                st.info(f"Reusing {job_summary['reused']} sections with unchanged inputs; "
+                        f"{job_summary['queued']} to generate" + (f" – changed fields: {changed}" if changed else "."))
+            progress = st.progress(0.0, text="Starting batch generation...")
+
+            def on_progress(counts):
+                finished = counts.get('done', 0) + counts.get('failed', 0) + counts.get('skipped', 0)
+                progress.progress(finished / counts['total'], text=f"{finished}/{counts['total']} sections")
+
+            job_progress = jobs.run_job(job_store(), job_id, int(max_in_flight), on_progress)
+            if job_progress.get('failed'):
+                st.error(f"{job_progress['failed']} sections failed. Click again to retry only those.")
+            else:
+                st.success(f"Generated content for {len(products)} products.")
+            if job_progress.get('skipped'):
+                st.info(f"{job_progress['skipped']} sections skipped, with no prompt for their product (hero image "
+                        f"briefs exist for {', '.join(HERO_BRANDS)} only); the reasons are in the results.")
+
+        if job_progress.get('done') or job_progress.get('failed'):
+            # The whole catalog is only serialised on request, not on every rerun of the page
+            if st.button("📄 Prepare Batch Results (JSON)"):
+                batch_results = {result['sku']: result for result in job_store().results(job_id)}
+                batch_json = json.dumps(batch_results, indent=2, ensure_ascii=False)
+                st.download_button("Download Batch Results (JSON)", data=batch_json,
+                                   file_name="batch_listing_content.json", mime="application/json")
+
+            # The archive is built on a background thread, so the rest of the page stays usable meanwhile
+            zip_path = os.path.join(export.EXPORT_DIR, f"{job_id}.zip")
+            if st.button("🗜️ Build ZIP (Word + JSON per SKU)"):
+                export.start_zip_export(job_store().results(job_id), zip_path, len(products))
+            zip_job = export.zip_export(zip_path)
+            if zip_job and not zip_job.finished:
+                zip_progress(zip_path)
+            elif zip_job and zip_job.error:
+                st.error(f"ZIP export failed: {zip_job.error}")
+            elif os.path.exists(zip_path):
+                # The archive is only read into the page right after it is built or on request, not on every rerun
+                just_built = st.session_state.pop('zip_ready', None) == zip_path
+                if just_built or st.button("📦 Prepare ZIP Download"):
+                    with open(zip_path, 'rb') as f:
+                        st.download_button("Download ZIP", data=f, file_name="listing_content.zip",
+                                           mime="application/zip")
+
     else:
         st.error("'Product Name' column not found. Please check your sheet headers.")
 else:
@@ -0,0 +1,214 @@
+# Offline catalog generation through the OpenAI Batch API: export JSONL, submit, poll, ingest
+import argparse
+import json
+import os
+import sys
+import time
+
+import openai
+
+from batch_generate import write_result
+from cache import cache_key
+from generation import MODEL, SYSTEM_MESSAGE, TEMPERATURE, cache, product_sku
+from kld import read_kld
+from prompts import SECTIONS, build_prompt, unsupported_reason
+
+ENDPOINT = "/v1/chat/completions"
+# The Batch API accepts at most 50,000 requests per input file
+MAX_REQUESTS_PER_FILE = 50000
+FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def make_client(base_url=None):
+    # base_url points the whole flow at another server, e.g. a local fake for testing
+    if base_url:
+        return openai.OpenAI(base_url=base_url, api_key=os.getenv("OPENAI_API_KEY") or "local")
+    return openai.OpenAI()
+
+
+def custom_id(sku, section):
+    return f"{sku}::{section}"
+
+
+def batch_requests(df, sections=SECTIONS):
+    seen = set()
+    for index, (_, product_info) in enumerate(df.iterrows()):
+        sku = product_sku(product_info, index)
+        if sku in seen:
+            raise ValueError(f"Duplicate SKU '{sku}' - batch results are matched by SKU, so it must be unique")
+        seen.add(sku)
+        for section in sections:
+            # Nothing to send; ingest_results reports these as skipped
+            if unsupported_reason(section, product_info):
+                continue
+            yield {
+                "custom_id": custom_id(sku, section),
+                "method": "POST",
+                "url": ENDPOINT,
+                "body": {
+                    "model": MODEL,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_MESSAGE},
+                        {"role": "user", "content": build_prompt(section, product_info)}
+                    ],
+                    "temperature": TEMPERATURE,
+                },
+            }
+
+
+def export_batch_files(df, path, sections=SECTIONS):
+    """Write the batch input JSONL, split into numbered parts when it exceeds the per-file limit."""
+    stem, extension = os.path.splitext(path)
+    paths = []
+    f = None
+    for count, request in enumerate(batch_requests(df, sections)):
+        if count % MAX_REQUESTS_PER_FILE == 0:
+            if f:
+                f.close()
+            paths.append(f"{stem}-{len(paths) + 1:03d}{extension}")
+            f = open(paths[-1], 'w', encoding='utf-8')
+        f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    if f:
+        f.close()
+    if len(paths) == 1:
+        os.replace(paths[0], path)
+        paths = [path]
+    return paths
+
+
+def submit_batch(client, path):
+    with open(path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    return client.batches.create(input_file_id=input_file.id, endpoint=ENDPOINT, completion_window="24h")
+
+
+def wait_for_batch(client, batch_id, poll_interval=60):
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts:
+            print(f"{batch_id}: {batch.status} ({counts.completed}/{counts.total} done, {counts.failed} failed)")
+        if batch.status in FINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def _file_lines(client, file_id):
+    if not file_id:
+        return []
+    return [json.loads(line) for line in client.files.content(file_id).text.splitlines() if line.strip()]
+
+
+def ingest_results(client, batches, df, sections=SECTIONS):
+    """Turn finished batches back into one result dict per SKU, matched by custom_id.
+
+    Successful responses are also written to the response cache, so the app
+    shows them instantly for the same product.
+    """
+    responses = {}
+    for batch in batches:
+        for line in _file_lines(client, batch.output_file_id) + _file_lines(client, batch.error_file_id):
+            responses[line['custom_id']] = line
+
+    for index, (_, product_info) in enumerate(df.iterrows()):
+        sku = product_sku(product_info, index)
+        result = {'sku': sku, 'product_name': str(product_info['Product Name']), 'sections': {}, 'errors': {},
+                  'skipped': {}}
+        for section in sections:
+            line = responses.get(custom_id(sku, section))
+            response = (line or {}).get('response') or {}
+            reason = unsupported_reason(section, product_info)
+            if reason:
+                result['sections'][section] = ""
+                result['skipped'][section] = reason
+            elif response.get('status_code') == 200:
+                text = response['body']['choices'][0]['message']['content'].strip()
+                cache.put(cache_key(MODEL, SYSTEM_MESSAGE, build_prompt(section, product_info), TEMPERATURE), text)
+                result['sections'][section] = text
+            else:
+                result['sections'][section] = ""
+                if line is None:
+                    result['errors'][section] = "no result in batch output"
+                else:
+                    result['errors'][section] = json.dumps(line.get('error') or response.get('body'))
+        yield result
+
+
+def write_results(results, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    failed = 0
+    total = 0
+    for total, result in enumerate(results, 1):
+        write_result(out_dir, result)
+        if result['errors']:
+            failed += 1
+            print(f"{result['sku']} failed: {', '.join(result['errors'])}")
+        for section, reason in result['skipped'].items():
+            print(f"{result['sku']} skipped {section}: {reason}")
+    print(f"Wrote {total} products ({failed} with errors) -> {out_dir}")
+    return 1 if failed else 0
+
+
+def load_products(path):
+    df = read_kld(path)
+    return df.dropna(subset=['Product Name'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate listing content through the OpenAI Batch API.")
+    parser.add_argument('--base-url', help="alternative OpenAI-compatible API base URL (e.g. a local fake server)")
+    parser.add_argument('--poll-interval', type=float, default=60, help="seconds between status checks (default: 60)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="write the batch input JSONL for every KLD row")
+    export.add_argument('kld')
+    export.add_argument('-o', '--out', default='batch_input.jsonl')
+
+    submit = commands.add_parser('submit', help="upload batch input files and create batches")
+    submit.add_argument('files', nargs='+')
+
+    wait = commands.add_parser('wait', help="poll batches until they finish")
+    wait.add_argument('batch_ids', nargs='+')
+
+    ingest = commands.add_parser('ingest', help="write per-SKU results from finished batches")
+    ingest.add_argument('kld')
+    ingest.add_argument('batch_ids', nargs='+')
+    ingest.add_argument('-o', '--out', default='output')
+
+    run = commands.add_parser('run', help="export, submit, wait and ingest in one go")
+    run.add_argument('kld')
+    run.add_argument('-o', '--out', default='output')
+    run.add_argument('--input-file', default='batch_input.jsonl')
+
+    for command in (export, run):
+        command.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS)
+    ingest.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        for path in export_batch_files(load_products(args.kld), args.out, args.sections):
+            print(path)
+        return 0
+
+    client = make_client(args.base_url)
+    if args.command == 'submit':
+        for path in args.files:
+            print(submit_batch(client, path).id)
+        return 0
+    if args.command == 'wait':
+        batches = [wait_for_batch(client, batch_id, args.poll_interval) for batch_id in args.batch_ids]
+        return 0 if all(batch.status == 'completed' for batch in batches) else 1
+    if args.command == 'ingest':
+        df = load_products(args.kld)
+        batches = [client.batches.retrieve(batch_id) for batch_id in args.batch_ids]
+        return write_results(ingest_results(client, batches, df, args.sections), args.out)
+
+    df = load_products(args.kld)
+    batch_ids = [submit_batch(client, path).id for path in export_batch_files(df, args.input_file, args.sections)]
+    print(f"Submitted {', '.join(batch_ids)}")
+    batches = [wait_for_batch(client, batch_id, args.poll_interval) for batch_id in batch_ids]
+    return write_results(ingest_results(client, batches, df, args.sections), args.out)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
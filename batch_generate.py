@@ -0,0 +1,110 @@
+# Headless batch mode: generate every section for every product in a KLD sheet
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import export
+import generation
+import jobs
+import token_budget
+from generation import DEFAULT_MAX_IN_FLIGHT, metrics
+from kld import read_kld
+from prompts import SECTIONS
+from variants import DEFAULT_THRESHOLD
+
+
+def write_result(out_dir, result):
+    path = os.path.join(out_dir, f"{result['sku']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate listing content for every product in a KLD sheet.")
+    parser.add_argument('kld', help="path to the KLD sheet (.xlsx, .csv or .parquet)")
+    parser.add_argument('-o', '--out', default='output', help="directory for the per-SKU JSON files (default: output)")
+    parser.add_argument('--zip', help="also write the per-SKU Word and JSON files into this ZIP archive")
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help=f"maximum concurrent API requests (default: {DEFAULT_MAX_IN_FLIGHT})")
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS,
+                        help="sections to generate (default: all)")
+    parser.add_argument('--structured-web', action='store_true',
+                        help="generate the website sections in one structured-output call per product")
+    parser.add_argument('--variants', dest='variant_threshold', type=float, nargs='?', const=DEFAULT_THRESHOLD,
+                        help="generate once per group of variants (same product, other size/pack/price) and derive "
+                             f"the rest; optional MinHash similarity threshold (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument('--job-db', default=jobs.DEFAULT_JOB_DB,
+                        help=f"SQLite job store used to resume interrupted runs (default: {jobs.DEFAULT_JOB_DB})")
+    parser.add_argument('--hedge-budget', type=float, default=generation.hedge_budget.fraction,
+                        help="fraction of extra requests allowed for hedging slow calls past their p95 (default: "
+                             f"{generation.hedge_budget.fraction:g}, set LLM_HEDGE_BUDGET to change)")
+    parser.add_argument('--metrics-out',
+                        help="write call metrics when done: Prometheus text for .prom, otherwise JSONL")
+    parser.add_argument('--job-id', help="job to resume (default: derived from the sheet contents and options)")
+    args = parser.parse_args(argv)
+    generation.hedge_budget.fraction = args.hedge_budget
+
+    df = read_kld(args.kld)
+    if 'Product Name' not in df.columns:
+        parser.error("'Product Name' column not found. Please check your sheet headers.")
+    df = df.dropna(subset=['Product Name'])
+
+    with open(args.kld, 'rb') as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+    store = jobs.JobStore(args.job_db)
+    job_id = args.job_id or jobs.job_id_for(content_hash, args.sections, args.structured_web, args.variant_threshold)
+    summary = store.create_job(df, args.sections, job_id, args.structured_web, args.variant_threshold)
+    if summary['variants']:
+        print(f"{summary['variants']} sections of variant products will be derived from their group's first product")
+    if summary['reused']:
+        print(f"Reused {summary['reused']} sections from earlier jobs with unchanged inputs, queued {summary['queued']}")
+        for field, count in sorted(summary['changed_fields'].items(), key=lambda item: -item[1]):
+            print(f"  {field} changed for {count} sections")
+    progress = store.progress(job_id)
+    print(f"Job {job_id}: {progress.get('done', 0)}/{progress['total']} sections already done")
+
+    def on_progress(counts):
+        print(f"  {counts.get('done', 0)}/{counts['total']} done, {counts.get('failed', 0)} failed, "
+              f"{counts.get('skipped', 0)} skipped")
+
+    start = time.time()
+    jobs.run_job(store, job_id, args.max_in_flight, on_progress, poll_interval=5)
+
+    if args.metrics_out:
+        with open(args.metrics_out, 'w', encoding='utf-8') as f:
+            f.write(metrics.to_prometheus() if args.metrics_out.endswith('.prom') else metrics.to_jsonl())
+
+    prompt_savings = token_budget.savings_report()
+    if prompt_savings:
+        before = sum(row['tokens_before'] for row in prompt_savings)
+        after = sum(row['tokens_after'] for row in prompt_savings)
+        trimmed = sum(row['trimmed'] for row in prompt_savings)
+        print(f"Prompt inputs: {after} of {before} KLD tokens sent ({before - after} saved, {trimmed} prompts trimmed)")
+
+    os.makedirs(args.out, exist_ok=True)
+    failed = 0
+    for result in store.results(job_id):
+        write_result(args.out, result)
+        if result['errors']:
+            failed += 1
+            print(f"{result['sku']} failed: {', '.join(result['errors'])}")
+        # Skipped sections have no prompt for the product, so retrying won't help and they don't fail the run
+        for section, reason in result['skipped'].items():
+            print(f"{result['sku']} skipped {section}: {reason}")
+
+    if args.zip:
+        written = export.write_zip(store.results(job_id), args.zip)
+        print(f"Wrote {written} products to {args.zip}")
+
+    print(f"Generated {len(df)} products in {time.time() - start:.1f}s ({failed} with errors) -> {args.out}")
+    if failed:
+        print(f"Re-run the same command to retry only the failed sections of job {job_id}.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+# Headless batch recolor for a garment colour: a folder or ZIP of designs in, recolored PNGs out
+import argparse
+import math
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+from PIL import Image
+
+import recolor_rules
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.tif', '.tiff', '.bmp')
+# zlib level for the PNGs; PIL's default. Encoding dominates the time per design, so lower is faster
+DEFAULT_COMPRESS_LEVEL = 6
+# Written into an output folder (a ZIP keeps it as its comment) once a batch is complete: the garment and a fingerprint
+# of its rules, so outputs made for another garment or with other rules are never mistaken for up to date
+STAMP_FILE = '.recolor-rules'
+
+
+def output_name(name):
+    # Outputs are always PNG so transparency survives
+    return os.path.splitext(name)[0] + '.png'
+
+
+def _zip_mtime(info):
+    return time.mktime(info.date_time + (0, 0, -1))
+
+
+def _zip_entry(name):
+    # ZIP times are in 2-second steps; rounding up keeps a fresh output from looking older than its input
+    info = zipfile.ZipInfo(name, time.localtime(math.ceil(time.time() / 2) * 2)[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    return info
+
+
+def list_designs(source, exclude=None):
+    """Return (name, mtime) for each image in a directory (recursively) or a ZIP archive, sorted by name."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            return sorted((info.filename, _zip_mtime(info)) for info in archive.infolist()
+                          if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS))
+    designs = []
+    for root, dirs, files in os.walk(source):
+        # Don't pick up our own output when it sits inside the input folder
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude]
+        for file in files:
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, file)
+                designs.append((os.path.relpath(path, source).replace(os.sep, '/'), os.path.getmtime(path)))
+    return sorted(designs)
+
+
+def _open_design(source, name):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            return Image.open(BytesIO(archive.read(name)))
+    return Image.open(os.path.join(source, name))
+
+
+def read_stamp(out):
+    """Return the garment:fingerprint stamp of a complete output folder or ZIP, or None."""
+    if out.lower().endswith('.zip'):
+        if not os.path.exists(out):
+            return None
+        with zipfile.ZipFile(out) as archive:
+            return archive.comment.decode() or None
+    try:
+        with open(os.path.join(out, STAMP_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def recolor_design(source, name, rule_set, out_dir=None, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """Recolor one design, reading it from the folder or ZIP `source`; runs in a worker process.
+
+    The PNG is written under `out_dir` if given, otherwise its bytes are
+    returned for the parent to add to an output ZIP. Returns (name, pixels, data).
+    """
+    with _open_design(source, name) as img:
+        # The decoded pixels are ours, so an RGBA design is recolored without another copy
+        adjusted = recolor_rules.remap_in_place(img.convert("RGBA") if img.mode != "RGBA" else img, rule_set)
+    pixels = adjusted.width * adjusted.height
+    if out_dir:
+        path = os.path.join(out_dir, output_name(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        adjusted.save(path + '.partial', format='PNG', compress_level=compress_level)
+        os.replace(path + '.partial', path)
+        return name, pixels, None
+    buffer = BytesIO()
+    adjusted.save(buffer, format='PNG', compress_level=compress_level)
+    return name, pixels, buffer.getvalue()
+
+
+def run_batch(source, out, garment='white', rules_path=recolor_rules.DEFAULT_RULES_PATH, workers=None, force=False,
+              compress_level=DEFAULT_COMPRESS_LEVEL, report=print):
+    """Recolor the designs in `source` for `garment` into the folder or `.zip` `out`; return (done, skipped, failed).
+
+    Designs whose output is already newer than the input are skipped (kept as
+    they are in an output ZIP), but only if `out` was last completed for the
+    same garment and rules. At most two designs per worker are in flight, so
+    memory stays bounded however big the drop is.
+    """
+    workers = workers or os.cpu_count() or 1
+    rule_set = recolor_rules.rule_set_for(garment, rules_path)
+    stamp = f"{garment}:{rule_set.fingerprint}"
+    to_zip = out.lower().endswith('.zip')
+    designs = list_designs(source, exclude=None if to_zip else os.path.abspath(out))
+    # Outputs made for another garment or with other rules are all stale
+    restamp = read_stamp(out) != stamp
+    force = force or restamp
+
+    existing = {}
+    if to_zip and os.path.exists(out):
+        with zipfile.ZipFile(out) as archive:
+            existing = {info.filename: _zip_mtime(info) for info in archive.infolist()}
+    elif not to_zip:
+        os.makedirs(out, exist_ok=True)
+        # Until this batch completes the folder is a mix of old and new rules, so the new stamp goes in at the end
+        if restamp and os.path.exists(os.path.join(out, STAMP_FILE)):
+            os.remove(os.path.join(out, STAMP_FILE))
+
+    def up_to_date(name, mtime):
+        if force:
+            return False
+        if to_zip:
+            return existing.get(output_name(name), -1) >= mtime
+        path = os.path.join(out, output_name(name))
+        return os.path.exists(path) and os.path.getmtime(path) >= mtime
+
+    todo = [name for name, mtime in designs if not up_to_date(name, mtime)]
+    skipped = len(designs) - len(todo)
+    report(f"{len(designs)} designs in {source}: {len(todo)} to recolor for {garment} garments, {skipped} already "
+           f"up to date ({workers} workers)")
+
+    archive = None
+    if to_zip:
+        # PNGs are already deflated, so they are stored as they are
+        archive = zipfile.ZipFile(out + '.partial', 'w', compression=zipfile.ZIP_STORED)
+        archive.comment = stamp.encode()
+        if existing:
+            # Carry over the outputs that are still current
+            keep = {output_name(name) for name, mtime in designs if up_to_date(name, mtime)}
+            with zipfile.ZipFile(out) as previous:
+                for info in previous.infolist():
+                    if info.filename in keep:
+                        archive.writestr(info, previous.read(info))
+
+    start = time.time()
+    done = failed = pixels = 0
+    tasks = iter(todo)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while True:
+            while len(pending) < workers * 2:
+                name = next(tasks, None)
+                if name is None:
+                    break
+                future = executor.submit(recolor_design, source, name, rule_set, None if to_zip else out,
+                                         compress_level)
+                pending[future] = name
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = pending.pop(future)
+                try:
+                    _, size, data = future.result()
+                except Exception as e:
+                    failed += 1
+                    report(f"  {name} failed: {e}")
+                    if not archive:
+                        # An older output would pass for current under the stamp; without it the design is retried
+                        path = os.path.join(out, output_name(name))
+                        for stale in (path, path + '.partial'):
+                            if os.path.exists(stale):
+                                os.remove(stale)
+                    continue
+                if archive:
+                    archive.writestr(_zip_entry(output_name(name)), data)
+                done += 1
+                pixels += size
+                elapsed = time.time() - start
+                report(f"  [{done + failed}/{len(todo)}] {name} – {done / elapsed:.1f} designs/s, "
+                       f"{pixels / elapsed / 1e6:.0f} MP/s")
+
+    if archive:
+        archive.close()
+        os.replace(out + '.partial', out)
+    else:
+        with open(os.path.join(out, STAMP_FILE), 'w', encoding='utf-8') as f:
+            f.write(stamp + '\n')
+    elapsed = time.time() - start
+    report(f"Recolored {done} designs ({pixels / 1e6:.0f} MP) in {elapsed:.1f}s, skipped {skipped}, "
+           f"{failed} failed -> {out}")
+    return done, skipped, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recolor a folder or ZIP of designs for a garment colour.")
+    parser.add_argument('source', help="folder of designs or a .zip archive (read without extracting)")
+    parser.add_argument('-o', '--out', default='recolored',
+                        help="output folder, or a .zip archive to write into (default: recolored)")
+    parser.add_argument('--garment', default='white', help="rule set to apply (default: white)")
+    parser.add_argument('--rules', default=recolor_rules.DEFAULT_RULES_PATH,
+                        help="JSON file of recolor rules per garment colour (default: garment_rules.json)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help=f"worker processes (default: {os.cpu_count()}, the number of cores)")
+    parser.add_argument('--force', action='store_true', help="recolor everything, even up-to-date outputs")
+    parser.add_argument('--compress-level', type=int, choices=range(10), default=DEFAULT_COMPRESS_LEVEL,
+                        metavar='0-9', help=f"PNG compression; lower is faster (default: {DEFAULT_COMPRESS_LEVEL})")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} not found")
+    try:
+        recolor_rules.rule_set_for(args.garment, args.rules)
+    except (OSError, KeyError, ValueError) as e:
+        parser.error(e.args[0] if isinstance(e, KeyError) else str(e))
+    _, _, failed = run_batch(args.source, args.out, args.garment, args.rules, args.workers, args.force,
+                             args.compress_level)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
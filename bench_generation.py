@@ -0,0 +1,184 @@
+# Throughput benchmark for the batch generation pipeline against the local mock LLM server
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+import generation
+import jobs
+from cache import ResponseCache
+from kld import KLD_COLUMNS
+from metrics import CallMetrics, percentile
+from mock_llm_server import add_server_arguments, server_from_args
+from prompts import HERO_BRANDS, SECTIONS
+from rate_limit import RateLimiter
+
+DEFAULT_SIZES = [1, 100, 10000]
+# Headline numbers shown by --compare; higher is better for SKUs/minute only
+COMPARED = ['skus_per_minute', 'p50_latency', 'p99_latency', 'retry_overhead', 'hedges', 'peak_memory_mb']
+
+
+def synthetic_kld(rows):
+    """A KLD sheet of `rows` distinct products with realistic field lengths."""
+    records = []
+    for i in range(rows):
+        records.append({
+            'SKU': f"BENCH-{i:06d}",
+            # Brands with a hero brief, so every section of every SKU is generated
+            'Brand Name': HERO_BRANDS[i % len(HERO_BRANDS)],
+            'Product Name': f"Hydrating Face Serum No. {i}",
+            'USPs Front': "Hyaluronic acid; Vitamin C; Lightweight; Non-sticky; Fragrance free",
+            'Other USPs': "Dermatologically tested, suitable for all skin types, cruelty free",
+            'Ingredients': "Aqua, Glycerin, Sodium Hyaluronate, Ascorbic Acid, Niacinamide, Panthenol, Allantoin",
+            'Claims': f"Visibly brighter skin in {i % 4 + 2} weeks, 72 hour hydration",
+            'How to use it?': "Apply 2-3 drops on clean face morning and night, follow with moisturiser",
+            'Appropriate Age': "18+",
+            'Net Weight': f"{30 + i % 3 * 10} ml",
+            'MRP': 499 + i % 5 * 100,
+            'Particulars': "1 serum bottle with dropper",
+            'Target Audience': "Adults with dull or dehydrated skin",
+            'Customer Care': "care@example.com",
+            'Other details': "Made in India",
+        })
+    return pd.DataFrame(records, columns=KLD_COLUMNS)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(rows, server, sections=SECTIONS, structured_web=False, max_workers=generation.DEFAULT_MAX_IN_FLIGHT,
+                  client_rpm=10 ** 6, client_tpm=10 ** 9):
+    """Generate `rows` synthetic products through jobs.run_job and measure the run.
+
+    The job store and response cache are fresh temporary files, so every
+    section is a real request to the mock server.
+    """
+    df = synthetic_kld(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        generation.cache = ResponseCache(os.path.join(tmp, 'cache.sqlite'))
+        generation.metrics = CallMetrics(log_path=None, max_records=rows * len(sections) * 2)
+        generation.limiter = RateLimiter(client_rpm, client_tpm)
+        store = jobs.JobStore(os.path.join(tmp, 'jobs.sqlite'))
+        server.reset_stats()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        job_id = jobs.job_id_for(f"bench-{rows}", sections, structured_web)
+        store.create_job(df, sections, job_id, structured_web)
+        progress = jobs.run_job(store, job_id, max_workers, poll_interval=0.5)
+        elapsed = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    records = [r for r in generation.metrics.records if not r['cache_hit']]
+    latencies = sorted(r['latency'] for r in records)
+    requests = server.stats()
+    ok = requests.get(200, 0)
+    return {
+        'rows': rows,
+        'tasks': progress['total'],
+        'done': progress.get('done', 0),
+        'failed': progress.get('failed', 0),
+        'elapsed': round(elapsed, 3),
+        'skus_per_minute': round(rows / elapsed * 60, 2),
+        'p50_latency': round(percentile(latencies, 0.5), 4),
+        'p99_latency': round(percentile(latencies, 0.99), 4),
+        'sections': {row['section']: {'p50_latency': round(row['p50_latency'], 4), 'calls': row['calls']}
+                     for row in generation.metrics.section_summary()},
+        'requests': requests['total'],
+        'errors': {str(status): count for status, count in requests.items() if status not in (200, 'total')},
+        # Requests beyond the successful ones are retries by the client (or extra repair calls)
+        'retry_overhead': round((requests['total'] - ok) / ok, 4) if ok else None,
+        'hedges': sum(r['hedged'] for r in records),
+        'tokens': sum(r['prompt_tokens'] + r['completion_tokens'] for r in records),
+        'peak_memory_mb': round(peak_memory / 2 ** 20, 2),
+    }
+
+
+def compare(baseline, current):
+    """Print the headline numbers of two result files side by side."""
+    old_runs = {run['rows']: run for run in baseline['runs']}
+    print(f"{'rows':>7} {'metric':<16} {baseline['revision']:>12} {current['revision']:>12} {'change':>9}")
+    for run in current['runs']:
+        old = old_runs.get(run['rows'])
+        if not old:
+            continue
+        for metric in COMPARED:
+            before, after = old.get(metric), run.get(metric)
+            change = f"{(after - before) / before:+.1%}" if before and after is not None else "n/a"
+            print(f"{run['rows']:>7} {metric:<16} {before if before is not None else '-':>12} "
+                  f"{after if after is not None else '-':>12} {change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batch generation against a local mock LLM server.")
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help=f"synthetic sheet sizes in rows (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS)
+    parser.add_argument('--structured-web', action='store_true')
+    parser.add_argument('--max-in-flight', type=int, default=generation.DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument('--client-rpm', type=int, default=10 ** 6,
+                        help="client-side limiter budget; the default effectively disables it")
+    parser.add_argument('--client-tpm', type=int, default=10 ** 9)
+    parser.add_argument('--hedge-budget', type=float, default=generation.hedge_budget.fraction,
+                        help="fraction of extra requests allowed for hedging slow calls past their p95 (default: "
+                             f"{generation.hedge_budget.fraction:g}, set LLM_HEDGE_BUDGET to change)")
+    parser.add_argument('-o', '--out', help="results file (default: bench_results/<timestamp>-<revision>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    generation.hedge_budget.fraction = args.hedge_budget
+
+    server = server_from_args(args).start()
+    os.environ['OPENAI_BASE_URL'] = server.url
+    os.environ['OPENAI_API_KEY'] = "bench"
+    generation.get_client.cache_clear()
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('out', 'compare')},
+        'runs': [],
+    }
+    try:
+        # One untimed request so the first run doesn't pay for building the HTTP client
+        generation.get_client().chat.completions.create(model=generation.MODEL,
+                                                        messages=[{"role": "user", "content": "warm-up"}])
+        for rows in args.sizes:
+            print(f"Running {rows} rows...", flush=True)
+            run = run_benchmark(rows, server, args.sections, args.structured_web, args.max_in_flight,
+                                args.client_rpm, args.client_tpm)
+            results['runs'].append(run)
+            print(f"  {run['skus_per_minute']} SKUs/min, p50 {run['p50_latency']}s, p99 {run['p99_latency']}s, "
+                  f"retry overhead {run['retry_overhead']}, peak {run['peak_memory_mb']} MB, {run['failed']} failed")
+    finally:
+        server.stop()
+
+    out = args.out or os.path.join('bench_results', f"{datetime.now():%Y%m%d-%H%M%S}-{results['revision']}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results -> {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
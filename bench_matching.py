@@ -0,0 +1,101 @@
+# Benchmark for contact_matching.compare_contacts against the old nested-loop matcher
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from contact_matching import attribute_orders, compare_contacts, normalize_email, normalize_phone
+
+
+def compare_contacts_nested(retell_contacts, shopify_orders):
+    # The previous O(orders × calls) implementation, kept as the reference for output and timing
+    matched_results = []
+    for order in shopify_orders:
+        email = normalize_email(order.get("email") or order.get("contact_email")) or ""
+        phone = normalize_phone(order.get("phone") or order.get("customer", {}).get("phone")) or ""
+
+        for call in retell_contacts:
+            if (call["email"] and call["email"] == email) or (call["phone"] and call["phone"] == phone):
+                matched_results.append({
+                    "call_id": call["call_id"],
+                    "call_email": call["email"],
+                    "call_phone": call["phone"],
+                    "order_id": order.get("name"),
+                    "order_email": email,
+                    "order_phone": phone,
+                    "customer_name": order.get("customer", {}).get("first_name", "") + " " + order.get("customer", {}).get("last_name", "")
+                })
+    return matched_results
+
+
+def _phone_formats(number):
+    # The same mobile number the way different systems write it
+    return [f"+91 {number[:5]} {number[5:]}", f"0{number}", number, f"+91-{number}", f"0091{number}"]
+
+
+def synthetic_data(orders, calls, overlap=0.3, seed=0, days=90):
+    """Orders and call contacts over `days`, where about `overlap` of the calls belong to a customer who ordered."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    customers = max(orders, calls)
+    numbers = [f"9{rng.randrange(10 ** 9):09d}" for _ in range(customers)]
+    shopify_orders = []
+    for i in range(orders):
+        customer = rng.randrange(customers)
+        shopify_orders.append({
+            "name": f"#{1000 + i}",
+            "created_at": (start + timedelta(seconds=rng.uniform(0, days * 86400))).isoformat(),
+            "email": f"Customer{customer}@Example.com" if rng.random() < 0.7 else None,
+            "phone": rng.choice(_phone_formats(numbers[customer])) if rng.random() < 0.8 else None,
+            "customer": {"first_name": f"First{customer}", "last_name": f"Last{customer}"},
+        })
+    retell_contacts = []
+    for i in range(calls):
+        customer = rng.randrange(orders) if rng.random() < overlap else orders + rng.randrange(10 ** 6)
+        number = numbers[customer] if customer < customers else f"8{rng.randrange(10 ** 9):09d}"
+        retell_contacts.append({
+            "call_id": f"call_{i}",
+            "start_timestamp": int(start.timestamp() * 1000 + rng.uniform(0, days * 86400000)),
+            "email": normalize_email(f"customer{customer}@example.com") if rng.random() < 0.3 else None,
+            "phone": normalize_phone(rng.choice(_phone_formats(number))),
+        })
+    return retell_contacts, shopify_orders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time hash-join contact matching against the nested loop.")
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--nested-sample', type=int, default=2000,
+                        help="orders and calls for the nested loop, which is extrapolated (default: 2000)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    calls, orders = synthetic_data(args.orders, args.calls, seed=args.seed)
+    start = time.perf_counter()
+    matches = compare_contacts(calls, orders)
+    indexed = time.perf_counter() - start
+    print(f"Hash join: {args.orders}×{args.calls} in {indexed:.2f}s, {len(matches)} matches")
+
+    start = time.perf_counter()
+    attributed = attribute_orders(calls, orders)
+    print(f"Attribution (72h look-back): {time.perf_counter() - start:.2f}s, {len(attributed)} of {args.orders} "
+          f"orders attributed, median {attributed['hours_to_conversion'].median():.1f}h to conversion")
+
+    n = args.nested_sample
+    sample_calls, sample_orders = synthetic_data(n, n, seed=args.seed)
+    start = time.perf_counter()
+    expected = compare_contacts_nested(sample_calls, sample_orders)
+    nested = time.perf_counter() - start
+    if compare_contacts(sample_calls, sample_orders) != expected:
+        print("Output differs from the nested loop on the sample!")
+        return 1
+    projected = nested * (args.orders / n) * (args.calls / n)
+    print(f"Nested loop: {n}×{n} in {nested:.2f}s (same output), "
+          f"projected {projected:.0f}s for {args.orders}×{args.calls} – {projected / indexed:.0f}× slower")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# Benchmark for test.darken_light_pixels against the old per-pixel getdata/putdata loop
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from test import darken_light_pixels
+
+
+def darken_light_pixels_loop(img):
+    # The previous per-pixel implementation, kept as the reference for output and timing
+    img = img.convert("RGBA")
+    new_data = []
+    for item in img.getdata():
+        if item[0] > 200 and item[1] > 200 and item[2] > 200:
+            new_data.append((30, 30, 30, item[3]))
+        else:
+            new_data.append(item)
+    img.putdata(new_data)
+    return img
+
+
+def synthetic_design(width, height, seed=0):
+    """An RGBA print file: white and light areas, coloured artwork and a transparent background."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    light = rng.random((height, width)) < 0.4
+    pixels[light, :3] = rng.integers(190, 256, (int(light.sum()), 3), dtype=np.uint8)
+    pixels[rng.random((height, width)) < 0.3, 3] = 0
+    return Image.fromarray(pixels)
+
+
+def measure(fn, img):
+    # tracemalloc sees both Python objects and NumPy buffers
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(img)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the vectorized recolor against the per-pixel loop.")
+    parser.add_argument('--width', type=int, default=4500)
+    parser.add_argument('--height', type=int, default=5400)
+    parser.add_argument('--loop-sample', type=int, default=1000,
+                        help="side of the square image for the loop, which is extrapolated (default: 1000)")
+    args = parser.parse_args(argv)
+    pixels = args.width * args.height
+
+    img = synthetic_design(args.width, args.height)
+    _, vectorized, vectorized_peak = measure(darken_light_pixels, img)
+    print(f"Vectorized: {args.width}×{args.height} in {vectorized:.2f}s, peak {vectorized_peak / 2 ** 20:.0f} MB")
+
+    sample = synthetic_design(args.loop_sample, args.loop_sample, seed=1)
+    expected, looped, looped_peak = measure(darken_light_pixels_loop, sample)
+    if not np.array_equal(np.asarray(darken_light_pixels(sample)), np.asarray(expected)):
+        print("Output differs from the per-pixel loop on the sample!")
+        return 1
+    scale = pixels / args.loop_sample ** 2
+    print(f"Per-pixel loop: {args.loop_sample}×{args.loop_sample} in {looped:.2f}s (same output), projected "
+          f"{looped * scale:.0f}s and {looped_peak * scale / 2 ** 30:.1f} GB for {args.width}×{args.height} – "
+          f"{looped * scale / vectorized:.0f}× slower, {looped_peak * scale / vectorized_peak:.0f}× the memory")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# Disk-backed LLM response cache shared across Streamlit sessions and processes
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 24 * 3600
+
+
+def cache_key(model, system_message, prompt, temperature, response_format=None):
+    parts = [model, system_message, prompt, temperature]
+    if response_format:
+        parts.append(response_format)
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite store keyed by prompt hash, with a TTL and size-based LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the cache safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, hit):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count(row is not None)
+        return row[0] if row else None
+
+    def put(self, key, response):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            if self.ttl:
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
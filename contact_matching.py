@@ -0,0 +1,213 @@
+# Matching Shopify orders to Retell calls on normalized email and phone, via hash lookups
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import pandas as pd
+
+# Numbers without a country code are assumed to be Indian mobiles
+DEFAULT_COUNTRY_CODE = "91"
+NATIONAL_NUMBER_LENGTH = 10
+DEFAULT_LOOKBACK = timedelta(hours=72)
+MATCH_COLUMNS = ['call_id', 'call_email', 'call_phone', 'order_id', 'order_email', 'order_phone', 'customer_name']
+ATTRIBUTION_COLUMNS = ['order_id', 'order_created_at', 'call_id', 'call_started_at', 'matched_on',
+                       'hours_to_conversion', 'order_email', 'order_phone', 'call_email', 'call_phone',
+                       'customer_name']
+
+
+def normalize_email(email):
+    email = (email or "").strip().lower()
+    return email or None
+
+
+def normalize_phone(phone, country_code=DEFAULT_COUNTRY_CODE):
+    """Return the number in E.164 form (+<country code><number>), or None if it isn't one.
+
+    "+91 98765-43210", "0091 9876543210", "09876543210" and "9876543210" all
+    become "+919876543210".
+    """
+    phone = (phone or "").strip()
+    if not phone:
+        return None
+    digits = re.sub(r"\D", "", phone)
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == NATIONAL_NUMBER_LENGTH + 1 and digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif len(digits) == NATIONAL_NUMBER_LENGTH:
+        digits = country_code + digits
+    # E.164 allows at most 15 digits; anything very short is an extension or junk
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+
+def date_in_range(iso_date, start, end):
+    if not iso_date:
+        return False
+    try:
+        dt = datetime.fromisoformat(iso_date.replace("Z", "+00:00"))
+        return start <= dt.date() <= end
+    except ValueError:
+        return False
+
+
+def timestamp_in_range(ms_timestamp, start, end):
+    dt = datetime.fromtimestamp(ms_timestamp / 1000, timezone.utc)
+    return start <= dt.date() <= end
+
+
+def extract_shopify_contacts(orders, start=None, end=None):
+    """All normalized emails and phones on orders (and their customers), optionally only orders created in range."""
+    emails = set()
+    phones = set()
+    for order in orders:
+        created_at = order.get("created_at")
+        if start and created_at and not date_in_range(created_at, start, end):
+            continue
+        email = normalize_email(order.get("email") or order.get("contact_email"))
+        if email:
+            emails.add(email)
+        phone = normalize_phone(order.get("phone"))
+        if phone:
+            phones.add(phone)
+        customer = order.get("customer", {})
+        if customer:
+            customer_email = normalize_email(customer.get("email"))
+            if customer_email:
+                emails.add(customer_email)
+            customer_phone = normalize_phone(customer.get("phone"))
+            if customer_phone:
+                phones.add(customer_phone)
+    return {"emails": emails, "phones": phones}
+
+
+def retell_contact(call):
+    return {
+        "call_id": call.get("call_id"),
+        "start_timestamp": call.get("start_timestamp"),
+        "email": normalize_email(call.get("retell_llm_dynamic_variables", {}).get("email")),
+        "phone": normalize_phone(call.get("to_number")),
+    }
+
+
+def extract_retell_contacts(calls):
+    return [retell_contact(call) for call in calls]
+
+
+def order_contact(order):
+    customer = order.get("customer") or {}
+    email = normalize_email(order.get("email") or order.get("contact_email"))
+    phone = normalize_phone(order.get("phone") or customer.get("phone"))
+    return email, phone
+
+
+def iter_matches(retell_contacts, shopify_orders):
+    """Yield one row per (order, call) pair that shares an email or phone, in order then call order.
+
+    Calls are indexed by email and phone once, so each order is a dictionary
+    lookup instead of a scan over every call. Orders can be any iterable and
+    are consumed one at a time.
+    """
+    calls_by_email = defaultdict(list)
+    calls_by_phone = defaultdict(list)
+    for index, call in enumerate(retell_contacts):
+        if call["email"]:
+            calls_by_email[call["email"]].append(index)
+        if call["phone"]:
+            calls_by_phone[call["phone"]].append(index)
+
+    for order in shopify_orders:
+        email, phone = order_contact(order)
+        matches = calls_by_email.get(email, []) if email else []
+        if phone and phone in calls_by_phone:
+            # A call matching on both email and phone is still one row
+            matches = sorted(set(matches).union(calls_by_phone[phone]))
+        if not matches:
+            continue
+        customer = order.get("customer", {})
+        for index in matches:
+            call = retell_contacts[index]
+            yield {
+                "call_id": call["call_id"],
+                "call_email": call["email"],
+                "call_phone": call["phone"],
+                "order_id": order.get("name"),
+                "order_email": email or "",
+                "order_phone": phone or "",
+                "customer_name": customer.get("first_name", "") + " " + customer.get("last_name", "")
+            }
+
+
+def compare_contacts(retell_contacts, shopify_orders):
+    return list(iter_matches(retell_contacts, shopify_orders))
+
+
+def _by_contact(rows, time_column, **to_datetime):
+    # One row per (contact, record): a record with both an email and a phone can match on either
+    frame = pd.DataFrame(rows)
+    frame[time_column] = pd.to_datetime(frame[time_column], utc=True, errors='coerce', **to_datetime)
+    keyed = pd.concat([frame.assign(contact=frame['email'], matched_on='email'),
+                       frame.assign(contact=frame['phone'], matched_on='phone')])
+    return keyed.dropna(subset=['contact', time_column]).sort_values(time_column, kind='stable')
+
+
+def _attribution_rows(shopify_orders):
+    for order in shopify_orders:
+        email, phone = order_contact(order)
+        customer = order.get("customer") or {}
+        yield {
+            "order_id": order.get("name"),
+            "order_created_at": order.get("created_at"),
+            "email": email,
+            "phone": phone,
+            "customer_name": customer.get("first_name", "") + " " + customer.get("last_name", ""),
+        }
+
+
+def _attribute(orders, call_rows, lookback):
+    order_rows = _by_contact(orders, 'order_created_at', format='ISO8601').reset_index(names='order_index')
+    matched = pd.merge_asof(order_rows, call_rows, left_on='order_created_at', right_on='call_started_at',
+                            by='contact', tolerance=pd.Timedelta(lookback), direction='backward',
+                            suffixes=('', '_call')).dropna(subset=['call_id'])
+    # An order found through both its email and its phone keeps the more recent call
+    matched = matched.sort_values('call_started_at', kind='stable').drop_duplicates('order_index', keep='last')
+    matched = matched.sort_values(['order_created_at', 'order_index'], kind='stable')
+    waited = matched['order_created_at'] - matched['call_started_at']
+    matched['hours_to_conversion'] = waited.dt.total_seconds() / 3600
+    matched = matched.rename(columns={'email': 'order_email', 'phone': 'order_phone',
+                                      'email_call': 'call_email', 'phone_call': 'call_phone'})
+    return matched[ATTRIBUTION_COLUMNS].reset_index(drop=True)
+
+
+def iter_attributions(retell_contacts, shopify_orders, lookback=DEFAULT_LOOKBACK, chunk_size=None):
+    """Yield attribute_orders results for `chunk_size` orders at a time (all at once if None).
+
+    The calls are indexed once; orders can be any iterable and only one chunk
+    of them is held in memory.
+    """
+    calls = [{"call_id": call["call_id"], "email": call["email"], "phone": call["phone"],
+              "call_started_at": call.get("start_timestamp")} for call in retell_contacts]
+    if not calls:
+        return
+    call_rows = _by_contact(calls, 'call_started_at', unit='ms').drop(columns='matched_on')
+    rows = _attribution_rows(shopify_orders)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield _attribute(chunk, call_rows, lookback)
+
+
+def attribute_orders(retell_contacts, shopify_orders, lookback=DEFAULT_LOOKBACK):
+    """Credit each order to the latest call to the same contact that started within `lookback` before it.
+
+    `retell_contacts` need a `start_timestamp` (ms). Computed with a sorted
+    as-of merge per contact, so it scales with rows rather than pairs. Returns
+    one row per attributed order, oldest first, with the time to conversion.
+    """
+    frames = list(iter_attributions(retell_contacts, shopify_orders, lookback))
+    return frames[0] if frames else pd.DataFrame(columns=ATTRIBUTION_COLUMNS)
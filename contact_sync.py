@@ -0,0 +1,326 @@
+# Incremental sync of Retell calls and Shopify orders into a local SQLite store
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import Full, Queue
+from datetime import date, datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_STORE_PATH = os.getenv("CONTACT_STORE_PATH", ".contacts.sqlite")
+SHOPIFY_PAGE_SIZE = 250
+RETELL_PAGE_SIZE = 1000
+DEFAULT_WORKERS = 4
+# Calls can still be updated (analysis, transcript) shortly after they start, so the Retell
+# high-water mark is re-read with this much overlap
+RETELL_OVERLAP_MS = 2 * 3600 * 1000
+
+
+class _Retry(Retry):
+    def parse_retry_after(self, retry_after):
+        # Shopify sends fractional seconds ("2.0"), which urllib3 rejects
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            return super().parse_retry_after(retry_after)
+
+
+def make_session(pool_size=16):
+    """A pooled session that backs off on 429/5xx, honouring Retry-After."""
+    session = requests.Session()
+    retry = _Retry(total=6, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                   allowed_methods=frozenset(['GET', 'POST']), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class FetchStats:
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.records = 0
+        self._lock = threading.Lock()
+
+    def add(self, response, records):
+        with self._lock:
+            self.requests += 1
+            self.bytes += len(response.content)
+            self.records += records
+
+
+def split_window(start, end, parts):
+    """Split [start, end) into up to `parts` consecutive windows of equal length."""
+    parts = max(1, parts)
+    step = (end - start) / parts
+    return [(start + step * i, start + step * (i + 1) if i < parts - 1 else end) for i in range(parts)]
+
+
+def _pages_in_parallel(pages, windows, workers):
+    """Yield the pages of `pages(start, end)` for every window, fetching the windows concurrently.
+
+    Pages pass through a bounded queue, so only a few are held in memory
+    however many there are; stopping early stops the fetchers.
+    """
+    if len(windows) == 1:
+        yield from pages(*windows[0])
+        return
+    queue = Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def run(window):
+        try:
+            for page in pages(*window):
+                if stop.is_set():
+                    return
+                put(page)
+        except Exception as e:
+            put(e)
+        finally:
+            put(finished)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for window in windows:
+                executor.submit(run, window)
+            remaining = len(windows)
+            while remaining:
+                item = queue.get()
+                if item is finished:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+
+def shopify_order_pages(session, url, auth, stats, created_min=None, created_max=None, updated_min=None,
+                        workers=DEFAULT_WORKERS):
+    """Pages of orders matching the server-side filters, following Link-header pagination.
+
+    A created_at window is split into `workers` sub-windows whose pages are
+    fetched concurrently; each sub-window pages through its own cursor.
+    """
+    def pages(window_min, window_max):
+        params = {'limit': SHOPIFY_PAGE_SIZE}
+        if window_min:
+            params['created_at_min'] = window_min.isoformat()
+        if window_max:
+            params['created_at_max'] = window_max.isoformat()
+        if updated_min:
+            params['updated_at_min'] = updated_min
+        next_url = url
+        while next_url:
+            response = session.get(next_url, auth=auth, params=params, timeout=60)
+            response.raise_for_status()
+            page = response.json().get('orders', [])
+            stats.add(response, len(page))
+            yield page
+            # The next link carries the cursor and every filter; Shopify rejects them being repeated
+            next_url = response.links.get('next', {}).get('url')
+            params = None
+
+    if created_min and created_max:
+        return _pages_in_parallel(pages, split_window(created_min, created_max, workers), workers)
+    return pages(created_min, created_max)
+
+
+def retell_call_pages(session, url, api_key, stats, start_ms, end_ms, workers=DEFAULT_WORKERS):
+    """Pages of calls that started in [start_ms, end_ms), paginated with pagination_key."""
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    def pages(window_start, window_end):
+        body = {
+            "filter_criteria": {"start_timestamp": {"lower_threshold": int(window_start),
+                                                    "upper_threshold": int(window_end) - 1}},
+            "sort_order": "ascending",
+            "limit": RETELL_PAGE_SIZE,
+        }
+        while True:
+            response = session.post(url, headers=headers, json=body, timeout=60)
+            response.raise_for_status()
+            data = response.json()
+            page = data if isinstance(data, list) else data.get("calls", [])
+            stats.add(response, len(page))
+            yield page
+            if len(page) < RETELL_PAGE_SIZE:
+                return
+            body = {**body, "pagination_key": page[-1]["call_id"]}
+
+    return _pages_in_parallel(pages, split_window(start_ms, end_ms, workers), workers)
+
+
+def parse_time(iso):
+    return datetime.fromisoformat(iso.replace("Z", "+00:00"))
+
+
+def utc_midnight(day):
+    return datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+
+
+def day_start_ms(day):
+    return int(utc_midnight(day).timestamp() * 1000)
+
+
+class ContactStore:
+    """Calls keyed by call_id and orders keyed by id, plus per-source sync state.
+
+    `synced_from` is the earliest date the store covers and `high_water` the
+    newest change seen, so each sync only fetches what is older or newer.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS calls (
+                    call_id TEXT PRIMARY KEY,
+                    start_timestamp INTEGER,
+                    call_json TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS calls_start ON calls (start_timestamp);
+                CREATE TABLE IF NOT EXISTS orders (
+                    id TEXT PRIMARY KEY,
+                    created_date TEXT,
+                    updated_at TEXT,
+                    order_json TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS orders_created ON orders (created_date);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    source TEXT PRIMARY KEY,
+                    synced_from TEXT,
+                    high_water TEXT,
+                    synced_at REAL
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def state(self, source):
+        with self._connect() as conn:
+            row = conn.execute("SELECT synced_from, high_water FROM sync_state WHERE source = ?", (source,)).fetchone()
+        return row or (None, None)
+
+    def set_state(self, source, synced_from, high_water):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (source, synced_from, high_water, synced_at) "
+                         "VALUES (?, ?, ?, ?)", (source, synced_from, high_water, time.time()))
+
+    def save_calls(self, calls):
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO calls (call_id, start_timestamp, call_json) VALUES (?, ?, ?)",
+                             [(call["call_id"], call.get("start_timestamp"), json.dumps(call)) for call in calls])
+
+    def save_orders(self, orders):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO orders (id, created_date, updated_at, order_json) VALUES (?, ?, ?, ?)",
+                # created_at keeps the store's own UTC offset, so its date is the order's local date
+                [(str(order["id"]), (order.get("created_at") or "")[:10] or None, order.get("updated_at"),
+                  json.dumps(order)) for order in orders],
+            )
+
+    def _iter_json(self, query, params, batch_size=1000):
+        with self._connect() as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield json.loads(row[0])
+
+    def iter_calls(self, start, end):
+        """Calls that started between the `start` and `end` dates (UTC), oldest first, read lazily."""
+        return self._iter_json("SELECT call_json FROM calls WHERE start_timestamp >= ? AND start_timestamp < ? "
+                               "ORDER BY start_timestamp",
+                               (day_start_ms(start), day_start_ms(end + timedelta(days=1))))
+
+    def iter_orders(self, start, end):
+        """Orders created between the `start` and `end` dates (store-local), oldest first, read lazily."""
+        return self._iter_json("SELECT order_json FROM orders WHERE created_date BETWEEN ? AND ? "
+                               "ORDER BY created_date", (start.isoformat(), end.isoformat()))
+
+    def calls_between(self, start, end):
+        return list(self.iter_calls(start, end))
+
+    def orders_between(self, start, end):
+        return list(self.iter_orders(start, end))
+
+
+def sync_retell(store, session, url, api_key, start, stats=None, workers=DEFAULT_WORKERS):
+    """Bring the store's calls up to date from `start` (a date) until now.
+
+    Each page is written as it arrives; the sync state only moves once every
+    page is in, so an interrupted sync is simply repeated.
+    """
+    stats = stats or FetchStats()
+    synced_from, high_water = store.state('retell')
+    now_ms = int(time.time() * 1000)
+    windows = []
+    if synced_from is None or start < date.fromisoformat(synced_from):
+        # Backfill the days before what the store already covers
+        backfill_end = now_ms if synced_from is None else day_start_ms(date.fromisoformat(synced_from))
+        windows.append((day_start_ms(start), backfill_end))
+        synced_from = start.isoformat()
+    if high_water is not None:
+        windows.append((int(high_water) - RETELL_OVERLAP_MS, now_ms))
+    newest = int(high_water or 0)
+    for window_start, window_end in windows:
+        for page in retell_call_pages(session, url, api_key, stats, window_start, window_end, workers):
+            store.save_calls(page)
+            newest = max([newest] + [call.get("start_timestamp") or 0 for call in page])
+    store.set_state('retell', synced_from, str(newest or now_ms))
+    return stats
+
+
+def sync_shopify(store, session, url, auth, start, stats=None, workers=DEFAULT_WORKERS):
+    """Bring the store's orders up to date: backfill from `start`, then everything updated since the last sync."""
+    stats = stats or FetchStats()
+    synced_from, high_water = store.state('shopify')
+    now = datetime.now(timezone.utc)
+    fetches = []
+    if synced_from is None or start < date.fromisoformat(synced_from):
+        # A day of margin either side so orders in any store timezone are covered
+        window_start = utc_midnight(start - timedelta(days=1))
+        window_end = now if synced_from is None else utc_midnight(date.fromisoformat(synced_from) + timedelta(days=1))
+        fetches.append({'created_min': window_start, 'created_max': window_end})
+        synced_from = start.isoformat()
+    if high_water is not None:
+        fetches.append({'updated_min': high_water})
+    newest = high_water
+    for filters in fetches:
+        for page in shopify_order_pages(session, url, auth, stats, workers=workers, **filters):
+            store.save_orders(page)
+            for order in page:
+                updated = order.get("updated_at")
+                if updated and (newest is None or parse_time(updated) > parse_time(newest)):
+                    newest = updated
+    store.set_state('shopify', synced_from, newest or now.isoformat())
+    return stats
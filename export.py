@@ -0,0 +1,104 @@
+# Word export of a product's listing content, and per-SKU DOCX/JSON bundles for whole catalogs
+import json
+import os
+import threading
+import zipfile
+from io import BytesIO
+
+WORD_SECTIONS = [
+    ('Amazon Bullet Points', 'bullets'),
+    ('Amazon Description', 'description'),
+    ('Shopify Description', 'shopify'),
+    ('Hero Image Prompts', 'hero'),
+    ('A+ Image Prompts', 'a_plus'),
+    ('Website Bullet Points', 'web_bullets'),
+    ('Website Description', 'web_description'),
+    ('USP', 'usp'),
+    ('What Do You Get', 'what_you_get'),
+    ('How to Use', 'how_to_use'),
+    ('FAQs', 'faqs'),
+    ('Customer Reviews', 'reviews')
+]
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def listing_docx(product_name, texts):
+    """Build the Word document for one product; `texts` maps section keys to content."""
+    # python-docx is only needed on export, so it isn't loaded until then
+    import docx
+
+    doc = docx.Document()
+    doc.add_heading(f"Product Listing Content – {product_name}", 0)
+    for title, key in WORD_SECTIONS:
+        content = texts.get(key, '')
+        if content:
+            doc.add_heading(title, level=1)
+            doc.add_paragraph(content, style='Normal')
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class ZipExport:
+    """Progress of one background ZIP export; `error` is set if it failed."""
+
+    def __init__(self, path, total):
+        self.path = path
+        self.total = total
+        self.written = 0
+        self.error = None
+        self.finished = False
+
+
+def write_zip(results, path, on_product=None):
+    """Write `<sku>.docx` and `<sku>.json` for each result straight into a ZIP at `path`.
+
+    Results are consumed one at a time and each entry is streamed into the
+    archive, so memory stays flat however many products there are. The archive
+    is built under a temporary name and moved into place when complete.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    partial = path + '.partial'
+    count = 0
+    with zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            with archive.open(f"{result['sku']}.docx", 'w') as f:
+                f.write(listing_docx(result['product_name'], result['sections']))
+            with archive.open(f"{result['sku']}.json", 'w') as f:
+                f.write(json.dumps(result, indent=2, ensure_ascii=False).encode('utf-8'))
+            count += 1
+            if on_product:
+                on_product(count)
+    os.replace(partial, path)
+    return count
+
+
+_exports = {}
+_exports_lock = threading.Lock()
+
+
+def start_zip_export(results, path, total):
+    """Build the ZIP on a background thread; an export already running for `path` is returned as is."""
+    with _exports_lock:
+        current = _exports.get(path)
+        if current and not current.finished:
+            return current
+        export = _exports[path] = ZipExport(path, total)
+
+    def run():
+        try:
+            write_zip(results, path, on_product=lambda count: setattr(export, 'written', count))
+        except Exception as e:
+            export.error = e
+        finally:
+            export.finished = True
+
+    threading.Thread(target=run, daemon=True, name=f"zip-export-{os.path.basename(path)}").start()
+    return export
+
+
+def zip_export(path):
+    with _exports_lock:
+        return _exports.get(path)
@@ -0,0 +1,280 @@
+# LLM calls for listing sections, shared by the Streamlit app and the batch CLI
+import asyncio
+import functools
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+from cache import ResponseCache, cache_key
+from metrics import CallMetrics
+from prompts import SECTIONS, build_prompt
+from rate_limit import RateLimiter
+from resilience import HedgeBudget, acall_with_retries, ahedged, call_with_retries, hedged
+from token_budget import count_tokens
+import web_content
+
+load_dotenv()
+
+MODEL = "gpt-4o-mini"
+SYSTEM_MESSAGE = "You are a professional ecommerce copywriter."
+TEMPERATURE = 0.7
+DEFAULT_MAX_IN_FLIGHT = 8
+# Rough completion size used to reserve TPM budget before the real usage is known
+ESTIMATED_COMPLETION_TOKENS = 1000
+# Per-request timeouts in seconds; long-form and multi-section calls get more room
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+SECTION_TIMEOUTS = {'a_plus': 120, 'reviews': 120, 'web_content': 180, 'web_content_repair': 180}
+# Enough keep-alive connections for every batch worker plus hedged duplicates
+POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+# A section needs this many uncached calls before its p95 is trusted as a hedging threshold
+MIN_HEDGE_SAMPLES = 20
+
+# Shared by every session in the process so concurrent users stay inside one budget
+limiter = RateLimiter(
+    rpm=int(os.getenv("OPENAI_RPM", "500")),
+    tpm=int(os.getenv("OPENAI_TPM", "200000")),
+)
+cache = ResponseCache()
+hedge_budget = HedgeBudget()
+metrics = CallMetrics()
+if os.getenv("LLM_METRICS_PORT"):
+    metrics.serve(int(os.getenv("LLM_METRICS_PORT")))
+
+Completion = namedtuple('Completion', 'text prompt_tokens completion_tokens cached')
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """Process-wide client, created on first use, whose connection pool stays warm across reruns.
+
+    Retries are off because resilience.py handles them with jittered backoff and counts them.
+    """
+    return openai.OpenAI(max_retries=0, http_client=openai.DefaultHttpxClient(limits=POOL_LIMITS))
+
+
+def section_timeout(section):
+    return SECTION_TIMEOUTS.get(section, DEFAULT_TIMEOUT)
+
+
+def hedge_delay(section):
+    # Duplicate a request once it runs past the section's p95 latency
+    if not hedge_budget.fraction or section is None:
+        return None
+    return metrics.section_latency(section, 0.95, MIN_HEDGE_SAMPLES)
+
+
+def _messages(instruction):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": instruction}
+    ]
+
+
+def _estimate(instruction):
+    # Tokens reserved from the limiter until the real usage is known
+    return count_tokens(SYSTEM_MESSAGE + instruction) + ESTIMATED_COMPLETION_TOKENS
+
+
+def _cached(key, section, sku, start):
+    # The cached response for `key`, recorded as a cache hit, or None
+    text = cache.get(key)
+    if text is not None:
+        metrics.record(section, MODEL, 0, 0, time.monotonic() - start, cache_hit=True, sku=sku)
+    return text
+
+
+def _counted_usage(instruction, text):
+    # Local count for a stream stopped before the API reported its usage; the tokens were still billed
+    prompt_tokens, completion_tokens = count_tokens(SYSTEM_MESSAGE + instruction), count_tokens(text)
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens)
+
+
+def _record_usage(estimate, usage, section, sku, start, retries, was_hedged=False, cancelled=False):
+    """Settle the limiter reservation and record an uncached call. Returns (prompt, completion) tokens."""
+    if usage:
+        limiter.adjust(estimate, usage.total_tokens)
+    prompt_tokens, completion_tokens = (usage.prompt_tokens, usage.completion_tokens) if usage else (0, 0)
+    metrics.record(section, MODEL, prompt_tokens, completion_tokens, time.monotonic() - start,
+                   cache_hit=False, retries=retries, sku=sku, hedged=was_hedged, cancelled=cancelled)
+    return prompt_tokens, completion_tokens
+
+
+def complete(instruction, use_cache=True, response_format=None, section=None, sku=None):
+    # use_cache=False skips the lookup but still stores the fresh response
+    start = time.monotonic()
+    key = cache_key(MODEL, SYSTEM_MESSAGE, instruction, TEMPERATURE, response_format)
+    cached = _cached(key, section, sku, start) if use_cache else None
+    if cached is not None:
+        return Completion(cached, 0, 0, True)
+    estimate = _estimate(instruction)
+
+    def request():
+        # Every attempt, retry or hedge, takes its own slot from the limiter
+        limiter.acquire_blocking(estimate)
+        return get_client().chat.completions.create(
+            model=MODEL,
+            messages=_messages(instruction),
+            temperature=TEMPERATURE,
+            timeout=section_timeout(section),
+            **({"response_format": response_format} if response_format else {})
+        )
+
+    (completion, retries), was_hedged = hedged(lambda: call_with_retries(request), hedge_delay(section), hedge_budget)
+    text = completion.choices[0].message.content.strip()
+    cache.put(key, text)
+    prompt_tokens, completion_tokens = _record_usage(estimate, completion.usage, section, sku, start, retries,
+                                                     was_hedged)
+    return Completion(text, prompt_tokens, completion_tokens, False)
+
+
+def generate_section(instruction, use_cache=True, response_format=None, section=None, sku=None):
+    return complete(instruction, use_cache, response_format, section, sku).text
+
+
+def generate_web_sections(product_info, sections=web_content.WEB_SECTIONS, use_cache=True, max_repairs=2, sku=None):
+    """Fill several website sections from a single structured-output call.
+
+    Sections that fail validation are re-requested on their own, up to
+    `max_repairs` times. Returns the section texts, any problems that remain
+    after the last attempt, and the (prompt, completion) tokens spent.
+    """
+    texts = {}
+    problems = {}
+    prompt_tokens = completion_tokens = 0
+    remaining = list(sections)
+    for attempt in range(max_repairs + 1):
+        prompt = web_content.web_content_prompt(product_info, remaining, list(problems.values()))
+        # Repairs always go to the API so a cached invalid answer isn't replayed
+        completion = complete(prompt, use_cache=use_cache and attempt == 0,
+                              response_format=web_content.response_format(remaining),
+                              section='web_content' if attempt == 0 else 'web_content_repair', sku=sku)
+        prompt_tokens += completion.prompt_tokens
+        completion_tokens += completion.completion_tokens
+        data = json.loads(completion.text)
+        problems = {}
+        for section in remaining:
+            texts[section] = web_content.format_section(section, data[section])
+            problem = web_content.validate_section(section, data[section])
+            if problem:
+                problems[section] = problem
+        remaining = list(problems)
+        if not remaining:
+            break
+    return texts, problems, (prompt_tokens, completion_tokens)
+
+
+def stream_section(instruction, use_cache=True, section=None, sku=None):
+    """Yield the response in chunks as tokens arrive.
+
+    Closing the generator early closes the HTTP stream, so a cancelled
+    generation stops billing tokens. Only completed streams are cached; a
+    cancelled one is still recorded, with its tokens counted locally.
+    """
+    start = time.monotonic()
+    key = cache_key(MODEL, SYSTEM_MESSAGE, instruction, TEMPERATURE)
+    cached = _cached(key, section, sku, start) if use_cache else None
+    if cached is not None:
+        yield cached
+        return
+    estimate = _estimate(instruction)
+
+    def request():
+        limiter.acquire_blocking(estimate)
+        return get_client().chat.completions.create(
+            model=MODEL,
+            messages=_messages(instruction),
+            temperature=TEMPERATURE,
+            timeout=section_timeout(section),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+    # Only opening the stream is retried; text already shown to the user can't be taken back
+    stream, retries = call_with_retries(request)
+    parts = []
+    usage = None
+    completed = False
+    try:
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        completed = True
+    finally:
+        stream.close()
+        _record_usage(estimate, usage or _counted_usage(instruction, "".join(parts)), section, sku, start, retries,
+                      cancelled=not completed)
+    cache.put(key, "".join(parts).strip())
+
+
+async def agenerate_section(client, instruction, use_cache=True, section=None, sku=None):
+    start = time.monotonic()
+    key = cache_key(MODEL, SYSTEM_MESSAGE, instruction, TEMPERATURE)
+    cached = _cached(key, section, sku, start) if use_cache else None
+    if cached is not None:
+        return cached
+    estimate = _estimate(instruction)
+
+    async def request():
+        await limiter.acquire(estimate)
+        return await client.chat.completions.create(
+            model=MODEL,
+            messages=_messages(instruction),
+            temperature=TEMPERATURE,
+            timeout=section_timeout(section)
+        )
+
+    (completion, retries), was_hedged = await ahedged(lambda: acall_with_retries(request), hedge_delay(section),
+                                                      hedge_budget)
+    text = completion.choices[0].message.content.strip()
+    cache.put(key, text)
+    _record_usage(estimate, completion.usage, section, sku, start, retries, was_hedged)
+    return text
+
+
+async def agenerate_sections(product_info, sections=SECTIONS, on_result=None, use_cache=True, sku=None):
+    """Send every section prompt for one product at once.
+
+    `on_result(section, text, error)` is called as each section finishes, so
+    callers can show results before the slowest section comes back.
+    """
+    # Async connections belong to one event loop, so each run gets its own pool
+    async with openai.AsyncOpenAI(max_retries=0,
+                                  http_client=openai.DefaultAsyncHttpxClient(limits=POOL_LIMITS)) as client:
+        async def run(section):
+            try:
+                return section, await agenerate_section(client, build_prompt(section, product_info), use_cache,
+                                                         section, sku), None
+            except Exception as e:
+                return section, "", e
+
+        results = {}
+        for next_done in asyncio.as_completed([run(section) for section in sections]):
+            section, text, error = await next_done
+            results[section] = text
+            if on_result:
+                on_result(section, text, error)
+    return results
+
+
+def generate_all_sections(product_info, sections=SECTIONS, on_result=None, use_cache=True, sku=None):
+    return asyncio.run(agenerate_sections(product_info, sections, on_result, use_cache, sku))
+
+
+def product_sku(product_info, index):
+    # Prefer an explicit SKU column, otherwise fall back to row number + product name
+    sku = str(product_info.get('SKU', '')).strip()
+    if sku and sku.lower() != 'nan':
+        return re.sub(r'[^A-Za-z0-9._-]+', '-', sku).strip('-')
+    name = re.sub(r'[^A-Za-z0-9]+', '-', str(product_info.get('Product Name', ''))).strip('-').lower()
+    return f"{index + 1:04d}-{name[:60]}"
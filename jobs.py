@@ -0,0 +1,386 @@
+# Persistent generation jobs: one SQLite row per (SKU, section) so interrupted runs resume
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import generation
+import variants
+from prompts import build_prompt, inputs_fingerprint, json_default, section_inputs, unsupported_reason
+from web_content import WEB_SECTIONS
+
+DEFAULT_JOB_DB = os.getenv("JOB_DB_PATH", ".jobs.sqlite")
+# A running task whose run hasn't renewed it for this long is taken to be abandoned (e.g. a crashed run)
+TASK_LEASE = float(os.getenv("JOB_TASK_LEASE", "600"))
+
+
+def job_id_for(content_hash, sections, structured_web=False, variant_threshold=None):
+    # Same sheet + same settings -> same job, so re-running a command resumes it
+    settings = [content_hash, list(sections), bool(structured_web)]
+    if variant_threshold is not None:
+        settings.append(variant_threshold)
+    payload = json.dumps(settings)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class JobStore:
+    def __init__(self, path=DEFAULT_JOB_DB):
+        self.path = path
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    sections TEXT NOT NULL,
+                    structured_web INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS products (
+                    job_id TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    product_name TEXT NOT NULL,
+                    product_json TEXT NOT NULL,
+                    PRIMARY KEY (job_id, sku)
+                );
+                CREATE TABLE IF NOT EXISTS tasks (
+                    job_id TEXT NOT NULL,
+                    sku TEXT NOT NULL,
+                    section TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    latency REAL,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    updated_at REAL,
+                    inputs TEXT,
+                    inputs_hash TEXT,
+                    reused_from TEXT,
+                    variant_of TEXT,
+                    run_id TEXT,
+                    PRIMARY KEY (job_id, sku, section)
+                );
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (job_id, status);
+            """)
+            # Stores created before input tracking existed get the new columns added in place
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column in ('inputs', 'inputs_hash', 'reused_from', 'variant_of', 'run_id'):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_inputs ON tasks (sku, section, inputs_hash)")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same task
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _read(self, query, params):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+    def create_job(self, df, sections, job_id, structured_web=False, variant_threshold=None):
+        """Register a job and its tasks; an existing job with the same id is left as is.
+
+        Each task records the KLD fields its prompt reads. When an earlier job
+        already generated the same SKU and section from identical inputs, the
+        result is copied instead of queued, so re-uploading an edited sheet only
+        regenerates sections whose inputs changed.
+
+        With `variant_threshold`, rows that are variants of one product (see
+        variants.cluster_products) wait for the first row of their group and
+        derive their sections from it instead of being generated.
+
+        Sections with no prompt for a product (see prompts.unsupported_reason)
+        are stored as 'skipped' with the reason; they are final and never sent.
+
+        Returns a summary with the number of reused, queued, variant and
+        skipped tasks and which fields caused regeneration.
+        """
+        now = time.time()
+        summary = {'reused': 0, 'queued': 0, 'variants': 0, 'skipped': 0, 'changed_fields': {}}
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone():
+                return summary
+            conn.execute("INSERT INTO jobs (id, sections, structured_web, created_at) VALUES (?, ?, ?, ?)",
+                         (job_id, json.dumps(list(sections)), int(structured_web), now))
+            products = [product_info for _, product_info in df.iterrows()]
+            groups = (variants.cluster_products(products, variant_threshold) if variant_threshold is not None
+                      else range(len(products)))
+            skus = []
+            for position, (group, product_info) in enumerate(zip(groups, products)):
+                sku = generation.product_sku(product_info, position)
+                skus.append(sku)
+                # The first row of a group comes before the others, so its SKU is already known
+                variant_of = skus[group] if group != position else None
+                if conn.execute("SELECT 1 FROM products WHERE job_id = ? AND sku = ?", (job_id, sku)).fetchone():
+                    raise ValueError(f"Duplicate SKU '{sku}' - job tasks are keyed by SKU, so it must be unique")
+                conn.execute(
+                    "INSERT INTO products (job_id, sku, position, product_name, product_json) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, sku, position, str(product_info['Product Name']),
+                     json.dumps(product_info.to_dict(), default=json_default)),
+                )
+                for section in sections:
+                    skipped = unsupported_reason(section, product_info)
+                    # A group leader with nothing to derive from leaves its variants to be generated on their own
+                    section_variant_of = (variant_of if variant_of and not unsupported_reason(section, products[group])
+                                          else None)
+                    web = structured_web and section in WEB_SECTIONS
+                    inputs = section_inputs(section, product_info, web)
+                    inputs_hash = inputs_fingerprint(section, inputs, web)
+                    inputs_json = json.dumps(inputs, default=json_default)
+                    previous = conn.execute(
+                        "SELECT job_id, result, inputs_hash, inputs FROM tasks WHERE sku = ? AND section = ? "
+                        "AND status = 'done' AND job_id != ? ORDER BY (inputs_hash = ?) DESC, updated_at DESC LIMIT 1",
+                        (sku, section, job_id, inputs_hash),
+                    ).fetchone()
+                    reused = not skipped and previous is not None and previous[2] == inputs_hash
+                    if skipped:
+                        summary['skipped'] += 1
+                    elif reused:
+                        summary['reused'] += 1
+                    elif section_variant_of:
+                        summary['variants'] += 1
+                    else:
+                        summary['queued'] += 1
+                        if previous and previous[3]:
+                            old_inputs = json.loads(previous[3])
+                            for field, value in json.loads(inputs_json).items():
+                                # Compared as JSON so empty (NaN) cells count as unchanged
+                                if json.dumps(old_inputs.get(field)) != json.dumps(value):
+                                    summary['changed_fields'][field] = summary['changed_fields'].get(field, 0) + 1
+                    status = ('skipped' if skipped else 'done' if reused else 'waiting' if section_variant_of
+                              else 'pending')
+                    conn.execute(
+                        "INSERT INTO tasks (job_id, sku, section, status, result, error, updated_at, inputs, "
+                        "inputs_hash, reused_from, variant_of) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, sku, section, status, previous[1] if reused else None, skipped, now,
+                         inputs_json, inputs_hash, previous[0] if reused else None,
+                         None if reused or skipped else section_variant_of),
+                    )
+            # Group leaders reused from earlier jobs are already done, so their variants can be derived now
+            for sku, section, result in conn.execute(
+                    "SELECT sku, section, result FROM tasks WHERE job_id = ? AND status = 'done' AND EXISTS "
+                    "(SELECT 1 FROM tasks v WHERE v.job_id = tasks.job_id AND v.variant_of = tasks.sku "
+                    "AND v.section = tasks.section AND v.status = 'waiting')", (job_id,)).fetchall():
+                self._resolve_variants(conn, job_id, sku, section, result)
+        return summary
+
+    def _resolve_variants(self, conn, job_id, sku, section, result):
+        """Derive the waiting variants of a finished task, or requeue those that can't be patched.
+
+        `result` is None when the task failed; its variants are marked failed and
+        go back to waiting on the next run.
+        """
+        waiting = conn.execute(
+            "SELECT sku, inputs FROM tasks WHERE job_id = ? AND variant_of = ? AND section = ? AND status = 'waiting'",
+            (job_id, sku, section),
+        ).fetchall()
+        if not waiting:
+            return
+        now = time.time()
+        if result is None:
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = ?, updated_at = ? "
+                "WHERE job_id = ? AND variant_of = ? AND section = ? AND status = 'waiting'",
+                (f"variant source {sku} failed", now, job_id, sku, section),
+            )
+            return
+        source_inputs = json.loads(conn.execute("SELECT inputs FROM tasks WHERE job_id = ? AND sku = ? AND section = ?",
+                                                (job_id, sku, section)).fetchone()[0])
+        for variant_sku, inputs in waiting:
+            text = variants.patch_text(result, source_inputs, json.loads(inputs))
+            if text is None:
+                # Generated on its own from now on, so a later failure doesn't send it back to waiting
+                conn.execute("UPDATE tasks SET status = 'pending', variant_of = NULL, updated_at = ? "
+                             "WHERE job_id = ? AND sku = ? AND section = ?", (now, job_id, variant_sku, section))
+            else:
+                conn.execute("UPDATE tasks SET status = 'done', result = ?, error = NULL, updated_at = ? "
+                             "WHERE job_id = ? AND sku = ? AND section = ?", (text, now, job_id, variant_sku, section))
+
+    def job(self, job_id):
+        rows = self._read("SELECT sections, structured_web FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        return {'id': job_id, 'sections': json.loads(rows[0][0]), 'structured_web': bool(rows[0][1])}
+
+    def reset_unfinished(self, job_id):
+        # Failed tasks and those left 'running' by a crashed run go back into the queue, or back to waiting
+        # for their group leader if they are variants. Tasks another live run holds are left to it
+        with self._transaction() as conn:
+            conn.execute("UPDATE tasks SET status = CASE WHEN variant_of IS NULL THEN 'pending' ELSE 'waiting' END "
+                         "WHERE job_id = ? AND (status = 'failed' OR (status = 'running' AND updated_at < ?))",
+                         (job_id, time.time() - TASK_LEASE))
+
+    def renew(self, job_id, run_id):
+        # Keeps the lease on the tasks a run is still working on
+        with self._transaction() as conn:
+            conn.execute("UPDATE tasks SET updated_at = ? WHERE job_id = ? AND run_id = ? AND status = 'running'",
+                         (time.time(), job_id, run_id))
+
+    def claim(self, job_id, structured_web=False, run_id=None):
+        """Take the next pending task. Returns (sku, product_info, sections) or None when the queue is empty.
+
+        With `structured_web`, all pending website sections of a SKU are claimed together
+        so they can be filled by one structured call.
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT sku, section FROM tasks WHERE job_id = ? AND status = 'pending' ORDER BY rowid LIMIT 1",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            sku, section = row
+            sections = [section]
+            if structured_web and section in WEB_SECTIONS:
+                sections = [s for (s,) in conn.execute(
+                    "SELECT section FROM tasks WHERE job_id = ? AND sku = ? AND status = 'pending' ORDER BY rowid",
+                    (job_id, sku),
+                ) if s in WEB_SECTIONS]
+            conn.executemany(
+                "UPDATE tasks SET status = 'running', attempts = attempts + 1, updated_at = ?, run_id = ? "
+                "WHERE job_id = ? AND sku = ? AND section = ?",
+                [(time.time(), run_id, job_id, sku, s) for s in sections],
+            )
+            product_json = conn.execute("SELECT product_json FROM products WHERE job_id = ? AND sku = ?",
+                                        (job_id, sku)).fetchone()[0]
+        return sku, json.loads(product_json), sections
+
+    def finish(self, job_id, sku, section, result, latency, prompt_tokens=0, completion_tokens=0, error=None):
+        # An error alongside a result marks the task failed but keeps the text (e.g. failed validation)
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = ?, latency = ?, prompt_tokens = prompt_tokens + ?, "
+                "completion_tokens = completion_tokens + ?, updated_at = ? WHERE job_id = ? AND sku = ? AND section = ?",
+                ('failed' if error else 'done', result, error, latency, prompt_tokens, completion_tokens, time.time(),
+                 job_id, sku, section),
+            )
+            self._resolve_variants(conn, job_id, sku, section, None if error else result)
+
+    def skip(self, job_id, sku, section, reason):
+        # Final: reset_unfinished leaves it alone. Its waiting variants are generated on their own instead
+        with self._transaction() as conn:
+            conn.execute("UPDATE tasks SET status = 'skipped', error = ?, updated_at = ? "
+                         "WHERE job_id = ? AND sku = ? AND section = ?", (reason, time.time(), job_id, sku, section))
+            conn.execute("UPDATE tasks SET status = 'pending', variant_of = NULL, updated_at = ? "
+                         "WHERE job_id = ? AND variant_of = ? AND section = ? AND status = 'waiting'",
+                         (time.time(), job_id, sku, section))
+
+    def progress(self, job_id):
+        counts = dict(self._read("SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status", (job_id,)))
+        counts['total'] = sum(counts.values())
+        return counts
+
+    def results(self, job_id):
+        """Yield one result dict per product, in sheet order.
+
+        Failed sections are listed under 'errors', skipped ones under 'skipped'
+        with the reason; both have an empty text.
+        """
+        job = self.job(job_id)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            products = conn.execute("SELECT sku, product_name FROM products WHERE job_id = ? ORDER BY position",
+                                    (job_id,))
+            for sku, product_name in products:
+                rows = {section: (status, result, error) for section, status, result, error in conn.execute(
+                    "SELECT section, status, result, error FROM tasks WHERE job_id = ? AND sku = ?", (job_id, sku))}
+                result = {'sku': sku, 'product_name': product_name, 'sections': {}, 'errors': {}, 'skipped': {}}
+                for section in job['sections']:
+                    status, text, error = rows.get(section, (None, None, "missing task"))
+                    result['sections'][section] = text or ""
+                    if status == 'skipped':
+                        result['skipped'][section] = error
+                    elif error:
+                        result['errors'][section] = error
+                yield result
+        finally:
+            conn.close()
+
+
+def _run_task(store, job_id, claimed, structured_web):
+    sku, product_info, sections = claimed
+    start = time.monotonic()
+    # Jobs stored before skipping existed can still hold such tasks as pending or failed
+    reason = unsupported_reason(sections[0], product_info)
+    if reason:
+        store.skip(job_id, sku, sections[0], reason)
+        return
+    try:
+        if structured_web and sections[0] in WEB_SECTIONS:
+            texts, problems, (prompt_tokens, completion_tokens) = generation.generate_web_sections(product_info, sections, sku=sku)
+            latency = time.monotonic() - start
+            # Token usage of the shared call is split evenly across its sections
+            for section in sections:
+                store.finish(job_id, sku, section, texts[section], latency,
+                             prompt_tokens // len(sections), completion_tokens // len(sections),
+                             error=problems.get(section))
+        else:
+            completion = generation.complete(build_prompt(sections[0], product_info), section=sections[0], sku=sku)
+            store.finish(job_id, sku, sections[0], completion.text, time.monotonic() - start,
+                         completion.prompt_tokens, completion.completion_tokens)
+    except Exception as e:
+        for section in sections:
+            store.finish(job_id, sku, section, None, time.monotonic() - start, error=str(e))
+
+
+def run_job(store, job_id, max_workers=generation.DEFAULT_MAX_IN_FLIGHT, on_progress=None, poll_interval=1.0):
+    """Work through every pending task of a job with `max_workers` threads.
+
+    `on_progress(counts)` is called from the calling thread, so it is safe to
+    update Streamlit elements from it. If the calling thread is interrupted
+    (e.g. a Streamlit rerun), workers finish their current task and claim no
+    more; the next run picks up from there.
+
+    Several runs can work on one job (another session, or the app and the
+    CLI): each renews the lease on the tasks it claimed while it polls, so
+    another run only requeues tasks whose lease ran out (see TASK_LEASE).
+    """
+    store.reset_unfinished(job_id)
+    structured_web = store.job(job_id)['structured_web']
+    run_id = os.urandom(8).hex()
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            claimed = store.claim(job_id, structured_web, run_id)
+            if claimed is None:
+                return
+            _run_task(store, job_id, claimed, structured_web)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        workers = [executor.submit(worker) for _ in range(max_workers)]
+        try:
+            while True:
+                done, running = wait(workers, timeout=poll_interval)
+                store.renew(job_id, run_id)
+                if on_progress:
+                    on_progress(store.progress(job_id))
+                if not running:
+                    break
+        finally:
+            stop.set()
+    for future in workers:
+        future.result()
+    return store.progress(job_id)
@@ -0,0 +1,34 @@
+# KLD sheet loading from Excel, CSV or Parquet exports, keeping only the columns the tool uses
+import io
+import os
+
+import pandas as pd
+
+KLD_COLUMNS = [
+    'SKU', 'Brand Name', 'Product Name', 'USPs Front', 'Other USPs', 'Ingredients', 'Claims',
+    'How to use it?', 'Appropriate Age', 'Net Weight', 'MRP', 'Particulars', 'Target Audience',
+    'Customer Care', 'Other details',
+]
+KLD_FILE_TYPES = ["xlsx", "csv", "parquet"]
+
+
+def _wanted(column):
+    return str(column).strip() in KLD_COLUMNS
+
+
+def read_kld(source, name=None):
+    """Read a KLD sheet from a path or raw bytes; `name` picks the format when passing bytes."""
+    extension = os.path.splitext(name or source)[1].lower()
+    data = io.BytesIO(source) if isinstance(source, bytes) else source
+    if extension == '.csv':
+        df = pd.read_csv(data, usecols=_wanted)
+    elif extension == '.parquet':
+        import pyarrow.parquet as pq
+        columns = [column for column in pq.ParquetFile(data).schema_arrow.names if _wanted(column)]
+        if isinstance(data, io.BytesIO):
+            data.seek(0)
+        df = pd.read_parquet(data, columns=columns)
+    else:
+        df = pd.read_excel(data, usecols=_wanted)
+    df.columns = df.columns.str.strip()
+    return df
@@ -0,0 +1,123 @@
+# Headless Retell/Shopify matching for cron: sync the local store, stream matches to CSV or Parquet
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+import pandas as pd
+from dotenv import load_dotenv
+
+import contact_sync
+from contact_matching import (ATTRIBUTION_COLUMNS, MATCH_COLUMNS, extract_retell_contacts, iter_attributions,
+                              iter_matches)
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def match_frames(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield pd.DataFrame(chunk, columns=MATCH_COLUMNS)
+
+
+def _parquet_schema(columns):
+    import pyarrow as pa
+
+    types = {'order_created_at': pa.timestamp('ns', tz='UTC'), 'call_started_at': pa.timestamp('ns', tz='UTC'),
+             'hours_to_conversion': pa.float64()}
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+def write_frames(frames, path, columns):
+    """Append each DataFrame to a CSV or (for .parquet paths) Parquet file as it arrives; return the row count.
+
+    The file is written under a temporary name and moved into place when complete.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    partial = path + '.partial'
+    rows = 0
+    if path.endswith('.parquet'):
+        # pyarrow is only needed for Parquet output
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _parquet_schema(columns)
+        with pq.ParquetWriter(partial, schema) as writer:
+            for frame in frames:
+                writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                rows += len(frame)
+    else:
+        with open(partial, 'w', newline='', encoding='utf-8') as f:
+            pd.DataFrame(columns=columns).to_csv(f, index=False)
+            for frame in frames:
+                frame.to_csv(f, index=False, header=False)
+                rows += len(frame)
+    os.replace(partial, path)
+    return rows
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        description="Match Retell calls to Shopify orders. API keys come from RETELL_API_KEY, SHOPIFY_API_KEY "
+                    "and SHOPIFY_API_PASSWORD.")
+    parser.add_argument('-o', '--out', default='retell_vs_shopify_matches.csv',
+                        help="output file, Parquet if it ends in .parquet (default: retell_vs_shopify_matches.csv)")
+    parser.add_argument('--start', type=date.fromisoformat, help="first day, YYYY-MM-DD (default: 7 days ago)")
+    parser.add_argument('--end', type=date.fromisoformat, help="last day, YYYY-MM-DD (default: today)")
+    parser.add_argument('--retell-url', default="https://api.retellai.com/v2/list-calls")
+    parser.add_argument('--shopify-url', default=os.getenv("SHOPIFY_ORDERS_URL"),
+                        help="orders.json endpoint (default: SHOPIFY_ORDERS_URL)")
+    parser.add_argument('--no-sync', action='store_true', help="only use what is already in the local store")
+    parser.add_argument('--store', default=contact_sync.DEFAULT_STORE_PATH,
+                        help=f"SQLite store of synced calls and orders (default: {contact_sync.DEFAULT_STORE_PATH})")
+    parser.add_argument('--attribution', action='store_true',
+                        help="one row per order, credited to the latest call before it within the look-back")
+    parser.add_argument('--lookback-hours', type=float, default=72, help="attribution look-back (default: 72)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"orders matched and written per batch (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--workers', type=int, default=contact_sync.DEFAULT_WORKERS,
+                        help=f"concurrent API requests per source (default: {contact_sync.DEFAULT_WORKERS})")
+    args = parser.parse_args(argv)
+    end = args.end or date.today()
+    start = args.start or end - timedelta(days=7)
+    lookback = timedelta(hours=args.lookback_hours)
+    # Calls from before the range can still be credited with orders inside it
+    calls_from = (start - timedelta(days=-(-lookback // timedelta(days=1)))) if args.attribution else start
+
+    store = contact_sync.ContactStore(args.store)
+    began = time.time()
+    if not args.no_sync:
+        retell_key, shopify_key = os.getenv("RETELL_API_KEY"), os.getenv("SHOPIFY_API_KEY")
+        shopify_password = os.getenv("SHOPIFY_API_PASSWORD")
+        if not (retell_key and shopify_key and shopify_password and args.shopify_url):
+            parser.error("syncing needs RETELL_API_KEY, SHOPIFY_API_KEY, SHOPIFY_API_PASSWORD and --shopify-url "
+                         "(or use --no-sync)")
+        session = contact_sync.make_session()
+        stats = contact_sync.FetchStats()
+        contact_sync.sync_retell(store, session, args.retell_url, retell_key, calls_from, stats, args.workers)
+        contact_sync.sync_shopify(store, session, args.shopify_url, (shopify_key, shopify_password), start, stats,
+                                  args.workers)
+        print(f"Fetched {stats.records} new or changed records in {stats.requests} requests "
+              f"({stats.bytes / 1024:.0f} KB)")
+
+    # Call contacts are indexed in memory; orders stream from the store one chunk at a time
+    calls = extract_retell_contacts(store.iter_calls(calls_from, end))
+    orders = store.iter_orders(start, end)
+    if args.attribution:
+        written = write_frames(iter_attributions(calls, orders, lookback, args.chunk_size), args.out,
+                               ATTRIBUTION_COLUMNS)
+    else:
+        written = write_frames(match_frames(iter_matches(calls, orders), args.chunk_size), args.out, MATCH_COLUMNS)
+    print(f"Wrote {written} rows for {start} to {end} against {len(calls)} calls in {time.time() - began:.1f}s "
+          f"-> {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
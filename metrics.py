@@ -0,0 +1,183 @@
+# Per-call LLM metrics (latency, tokens, cost, cache hits, retries) with Prometheus and JSONL export
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# USD per 1M tokens: (input, output)
+PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def call_cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = PRICING.get(model, (0, 0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def percentile(values, q):
+    # Nearest-rank percentile; values must already be sorted
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in labels.items())
+
+
+class CallMetrics:
+    """Process-wide call log.
+
+    Recent calls are kept in a bounded window for percentiles and per-SKU
+    tables, while the Prometheus counters are cumulative for the life of the
+    process. Every record is also appended to `log_path` when set.
+    """
+
+    def __init__(self, log_path=os.getenv("LLM_METRICS_LOG"), max_records=10000):
+        self.log_path = log_path
+        self.records = deque(maxlen=max_records)
+        self._totals = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def record(self, section, model, prompt_tokens, completion_tokens, latency, cache_hit, retries=0, sku=None,
+               hedged=False, cancelled=False):
+        record = {
+            'timestamp': time.time(),
+            'section': section or 'unknown',
+            'sku': sku,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency': latency,
+            'cache_hit': cache_hit,
+            'retries': retries,
+            'hedged': hedged,
+            'cancelled': cancelled,
+            'cost': call_cost(model, prompt_tokens, completion_tokens),
+        }
+        with self._lock:
+            self.records.append(record)
+            totals = self._totals[(record['section'], model)]
+            totals['calls'] += 1
+            totals['cache_hits'] += cache_hit
+            totals['retries'] += retries
+            totals['hedges'] += hedged
+            totals['cancelled'] += cancelled
+            totals['prompt_tokens'] += prompt_tokens
+            totals['completion_tokens'] += completion_tokens
+            totals['cost'] += record['cost']
+            if not cache_hit:
+                # Observations of the llm_latency_seconds summary, which like its quantiles leaves out cache hits
+                totals['latency_count'] += 1
+                totals['latency_sum'] += latency
+            if self.log_path:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+        return record
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self.records)
+
+    def section_summary(self):
+        # Latency percentiles only count real API calls; cache hits would drag them to zero
+        by_section = defaultdict(list)
+        for record in self._snapshot():
+            by_section[record['section']].append(record)
+        rows = []
+        for section, records in sorted(by_section.items()):
+            latencies = sorted(r['latency'] for r in records if not r['cache_hit'])
+            rows.append({
+                'section': section,
+                'calls': len(records),
+                'cache_hit_rate': sum(r['cache_hit'] for r in records) / len(records),
+                'p50_latency': percentile(latencies, 0.5),
+                'p95_latency': percentile(latencies, 0.95),
+                'retries': sum(r['retries'] for r in records),
+                'hedges': sum(r['hedged'] for r in records),
+                'tokens': sum(r['prompt_tokens'] + r['completion_tokens'] for r in records),
+                'cost': sum(r['cost'] for r in records),
+            })
+        return rows
+
+    def sku_summary(self):
+        by_sku = defaultdict(lambda: {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0})
+        for record in self._snapshot():
+            if record['sku'] is None:
+                continue
+            row = by_sku[record['sku']]
+            row['calls'] += 1
+            row['prompt_tokens'] += record['prompt_tokens']
+            row['completion_tokens'] += record['completion_tokens']
+            row['cost'] += record['cost']
+        return [{'sku': sku, **row} for sku, row in sorted(by_sku.items())]
+
+    def section_latency(self, section, q, min_samples=1):
+        # None until there are enough uncached calls for the percentile to mean something
+        latencies = sorted(r['latency'] for r in self._snapshot() if r['section'] == section and not r['cache_hit'])
+        return percentile(latencies, q) if len(latencies) >= max(min_samples, 1) else None
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            totals = {key: dict(value) for key, value in self._totals.items()}
+        metrics = [
+            ('llm_calls_total', 'counter', "LLM calls, including cache hits", 'calls'),
+            ('llm_cache_hits_total', 'counter', "LLM calls answered from the response cache", 'cache_hits'),
+            ('llm_retries_total', 'counter', "Retried LLM requests", 'retries'),
+            ('llm_hedges_total', 'counter', "Duplicate requests sent to cut tail latency", 'hedges'),
+            ('llm_cancelled_total', 'counter', "Streamed calls stopped before the response was complete", 'cancelled'),
+            ('llm_prompt_tokens_total', 'counter', "Prompt tokens sent", 'prompt_tokens'),
+            ('llm_completion_tokens_total', 'counter', "Completion tokens received", 'completion_tokens'),
+            ('llm_cost_usd_total', 'counter', "Estimated spend in USD", 'cost'),
+        ]
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (section, model), values in sorted(totals.items()):
+                lines.append(f"{name}{{{_labels(section=section, model=model)}}} {values[field]:g}")
+        # Quantiles come from the recent-call window, _sum and _count are cumulative, as in prometheus_client
+        latencies = defaultdict(list)
+        for record in self._snapshot():
+            if not record['cache_hit']:
+                latencies[(record['section'], record['model'])].append(record['latency'])
+        lines.append("# HELP llm_latency_seconds Latency of uncached LLM calls")
+        lines.append("# TYPE llm_latency_seconds summary")
+        for (section, model), values in sorted(totals.items()):
+            window = sorted(latencies[(section, model)])
+            for q in LATENCY_QUANTILES:
+                lines.append(f"llm_latency_seconds{{{_labels(section=section, model=model, quantile=q)}}} "
+                             f"{percentile(window, q):.4f}")
+            lines.append(f"llm_latency_seconds_sum{{{_labels(section=section, model=model)}}} "
+                         f"{values.get('latency_sum', 0):g}")
+            lines.append(f"llm_latency_seconds_count{{{_labels(section=section, model=model)}}} "
+                         f"{values.get('latency_count', 0):g}")
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self):
+        return "".join(json.dumps(record) + "\n" for record in self._snapshot())
+
+    def serve(self, port):
+        """Expose /metrics in Prometheus text format from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,230 @@
+# Local stand-in for the Retell list-calls and Shopify orders APIs: filters, cursor pagination and 429s
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SHOPIFY_PATH = "/admin/api/2024-01/orders.json"
+RETELL_PATH = "/v2/list-calls"
+SHOPIFY_TZ = timezone(timedelta(hours=5, minutes=30))
+
+
+def synthetic_records(calls=1000, orders=1000, days=30, overlap=0.3, seed=0):
+    """Raw Retell calls and Shopify orders spread over the last `days`, some sharing a phone number."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    numbers = [f"9{rng.randrange(10 ** 9):09d}" for _ in range(orders)]
+    order_list = []
+    for i in range(orders):
+        created = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        order_list.append({
+            "id": 5000000 + i,
+            "name": f"#{1000 + i}",
+            "created_at": created.astimezone(SHOPIFY_TZ).isoformat(timespec='seconds'),
+            "updated_at": created.astimezone(SHOPIFY_TZ).isoformat(timespec='seconds'),
+            "email": f"customer{i}@example.com",
+            "phone": f"+91{numbers[i]}",
+            "customer": {"first_name": f"First{i}", "last_name": f"Last{i}"},
+        })
+    call_list = []
+    for i in range(calls):
+        started = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        shared = orders and rng.random() < overlap
+        number = numbers[rng.randrange(orders)] if shared else f"8{rng.randrange(10 ** 9):09d}"
+        call_list.append({
+            "call_id": f"call_{i:06d}",
+            "start_timestamp": int(started.timestamp() * 1000),
+            "to_number": f"+91{number}",
+            "retell_llm_dynamic_variables": {},
+        })
+    return call_list, order_list
+
+
+def _encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def _decode_cursor(page_info):
+    return json.loads(base64.urlsafe_b64decode(page_info.encode()))
+
+
+def _parse_time(iso):
+    return datetime.fromisoformat(iso.replace("Z", "+00:00"))
+
+
+class MockContactServer:
+    """Serves Retell POST /v2/list-calls and Shopify GET /admin/api/2024-01/orders.json from a daemon thread.
+
+    Both honour their real date filters and cursors (`pagination_key`, Link
+    header `page_info`); `error_429` is the probability of a 429 with
+    Retry-After. Request counts and bytes sent are available from `stats()`.
+    """
+
+    def __init__(self, calls=(), orders=(), port=0, latency=0.0, error_429=0.0, seed=None):
+        self.calls = sorted(calls, key=lambda call: (call["start_timestamp"], call["call_id"]))
+        self.orders = sorted(orders, key=lambda order: order["id"])
+        self.latency = latency
+        self.error_429 = error_429
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def retell_url(self):
+        return self.url + RETELL_PATH
+
+    @property
+    def shopify_url(self):
+        return self.url + SHOPIFY_PATH + "?status=any"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts.clear()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def _rate_limited(self):
+        with self._lock:
+            return self.random.random() < self.error_429
+
+    def list_calls(self, body):
+        criteria = (body.get("filter_criteria") or {}).get("start_timestamp") or {}
+        lower = criteria.get("lower_threshold", 0)
+        upper = criteria.get("upper_threshold", float('inf'))
+        calls = [call for call in self.calls if lower <= call["start_timestamp"] <= upper]
+        if body.get("sort_order") == "descending":
+            calls.reverse()
+        if body.get("pagination_key"):
+            ids = [call["call_id"] for call in calls]
+            calls = calls[ids.index(body["pagination_key"]) + 1:] if body["pagination_key"] in ids else []
+        return calls[:body.get("limit", 1000)]
+
+    def list_orders(self, query):
+        """Return (status, orders, next cursor or None) for one orders.json request."""
+        if 'page_info' in query:
+            if set(query) - {'page_info', 'limit'}:
+                # Like Shopify: a cursor already carries the filters
+                return 400, {'errors': "page_info cannot be combined with other filters"}, None
+            cursor = _decode_cursor(query['page_info'])
+        else:
+            cursor = {'filters': {key: value for key, value in query.items() if key.endswith(('_min', '_max'))},
+                      'after': 0}
+        limit = min(int(query.get('limit', 50)), 250)
+        orders = [order for order in self.orders if order["id"] > cursor['after']]
+        for key, value in cursor['filters'].items():
+            field, bound = key.rsplit('_', 1)
+            value = _parse_time(value)
+            if bound == 'min':
+                orders = [order for order in orders if _parse_time(order[field]) >= value]
+            else:
+                orders = [order for order in orders if _parse_time(order[field]) <= value]
+        page = orders[:limit]
+        next_cursor = {**cursor, 'after': page[-1]["id"]} if len(orders) > limit else None
+        return 200, {'orders': page}, next_cursor
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+                mock._count('bytes', len(data))
+
+            def _throttle(self, source):
+                time.sleep(mock.latency)
+                if mock._rate_limited():
+                    mock._count(f'{source}_429')
+                    self._send_json(429, {'errors': "Too many requests (injected)"}, {'Retry-After': "0.1"})
+                    return True
+                mock._count(f'{source}_requests')
+                return False
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path != SHOPIFY_PATH:
+                    self._send_json(404, {'errors': f"Unknown path {url.path}"})
+                    return
+                if self._throttle('shopify'):
+                    return
+                query = {key: values[-1] for key, values in parse_qs(url.query).items() if key != 'status'}
+                status, body, next_cursor = mock.list_orders(query)
+                headers = {}
+                if next_cursor:
+                    page_info = _encode_cursor(next_cursor)
+                    link = f"{mock.url}{SHOPIFY_PATH}?limit={query.get('limit', 50)}&page_info={page_info}"
+                    headers['Link'] = f'<{link}>; rel="next"'
+                self._send_json(status, body, headers)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if self.path != RETELL_PATH:
+                    self._send_json(404, {'error': f"Unknown path {self.path}"})
+                    return
+                if self._throttle('retell'):
+                    return
+                self._send_json(200, mock.list_calls(body))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run local Retell and Shopify stand-ins with synthetic data.")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=30, help="spread records over this many days (default: 30)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response (default: 0)")
+    parser.add_argument('--error-429', type=float, default=0.0, help="probability of an injected 429 (default: 0)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    calls, orders = synthetic_records(args.calls, args.orders, args.days, seed=args.seed)
+    server = MockContactServer(calls, orders, args.port, args.latency, args.error_429, args.seed).start()
+    print(f"Retell: {server.retell_url}\nShopify: {server.shopify_url}\nAny API key works. Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
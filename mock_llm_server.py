@@ -0,0 +1,299 @@
+# Local OpenAI-compatible stand-in for load tests: configurable latency, error injection and rate limits
+import argparse
+import email.parser
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rate_limit import RateLimiter
+
+FILLER = "Gentle everyday care that keeps skin soft, calm and comfortable all day long".split()
+
+
+def _text(tokens):
+    # ~1 word per token is close enough for load testing
+    return " ".join(FILLER[i % len(FILLER)] for i in range(max(tokens, 1)))
+
+
+def _fill_schema(schema, prompt, name=None):
+    """Build a value matching a json_schema, honouring "<name> – exactly N" counts in the prompt."""
+    if schema['type'] == 'object':
+        return {key: _fill_schema(value, prompt, key) for key, value in schema['properties'].items()}
+    if schema['type'] == 'array':
+        match = re.search(rf"{re.escape(name)} – exactly (\d+)", prompt) if name else None
+        count = int(match.group(1)) if match else 3
+        return [_fill_schema(schema['items'], prompt) for _ in range(count)]
+    return "Soft skin daily"
+
+
+class MockLLMServer:
+    """Serves /v1/chat/completions, and the Batch API's /v1/files and /v1/batches, from a daemon thread.
+
+    Latency is log-normal around `latency` seconds plus `completion_tokens / tokens_per_second`.
+    `error_429` / `error_5xx` are per-request failure probabilities, and `rpm` / `tpm`
+    enforce server-side budgets that answer 429 with a retry-after hint, like the real API.
+    Batches run in the background through the same simulation, so failed lines land in the
+    error file. Request counts by status are available from `stats()` or GET /stats.
+    """
+
+    def __init__(self, port=0, latency=0.05, latency_sigma=0.5, tokens_per_second=0, completion_tokens=300,
+                 error_429=0.0, error_5xx=0.0, rpm=None, tpm=None, seed=None):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.limiter = RateLimiter(rpm or 10 ** 9, tpm or 10 ** 12) if rpm or tpm else None
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        self.files = {}
+        self.batches = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1/"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        counts['total'] = sum(counts.values())
+        return counts
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts.clear()
+
+    def _count(self, status):
+        with self._lock:
+            self.counts[status] += 1
+
+    def _roll(self):
+        with self._lock:
+            return self.random.random(), self.random.lognormvariate(0, self.latency_sigma)
+
+    def respond(self, request):
+        """Return (status, headers, body or list of SSE events) for one chat completion request."""
+        prompt = "\n".join(message['content'] for message in request['messages'])
+        prompt_tokens = len(prompt) // 4
+        roll, jitter = self._roll()
+        if self.limiter:
+            delay = self.limiter._try_acquire(prompt_tokens + self.completion_tokens)
+            if delay:
+                return 429, {'retry-after-ms': str(int(delay * 1000) + 1)}, {
+                    'error': {'message': "Rate limit reached", 'type': 'requests', 'code': 'rate_limit_exceeded'}}
+        if roll < self.error_429:
+            return 429, {'retry-after-ms': "100"}, {
+                'error': {'message': "Rate limit reached (injected)", 'type': 'requests', 'code': 'rate_limit_exceeded'}}
+        if roll < self.error_429 + self.error_5xx:
+            return 500, {}, {'error': {'message': "Internal server error (injected)", 'type': 'server_error'}}
+
+        time.sleep(self.latency * jitter + (self.completion_tokens / self.tokens_per_second
+                                            if self.tokens_per_second else 0))
+        response_format = request.get('response_format') or {}
+        if response_format.get('type') == 'json_schema':
+            content = json.dumps(_fill_schema(response_format['json_schema']['schema'], prompt))
+        else:
+            content = _text(self.completion_tokens)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': self.completion_tokens,
+                 'total_tokens': prompt_tokens + self.completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        base = {'id': completion_id, 'created': int(time.time()), 'model': request['model']}
+        if request.get('stream'):
+            events = [{**base, 'object': 'chat.completion.chunk', 'choices': [
+                {'index': 0, 'delta': {'content': word + " "}, 'finish_reason': None}]} for word in content.split()]
+            events.append({**base, 'object': 'chat.completion.chunk', 'choices': [
+                {'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+            if (request.get('stream_options') or {}).get('include_usage'):
+                events.append({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})
+            return 200, {}, events
+        return 200, {}, {**base, 'object': 'chat.completion', 'usage': usage, 'choices': [
+            {'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}]}
+
+    def add_file(self, data, filename='', purpose='batch'):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            self.files[file_id] = data
+        return {'id': file_id, 'object': 'file', 'bytes': len(data), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}
+
+    def create_batch(self, request):
+        """Start a batch over an uploaded JSONL file; it completes in the background."""
+        with self._lock:
+            data = self.files.get(request.get('input_file_id'))
+        if data is None:
+            return 404, {'error': {'message': f"No such file: {request.get('input_file_id')}"}}
+        lines = [json.loads(line) for line in data.decode('utf-8').splitlines() if line.strip()]
+        batch = {'id': f"batch_{uuid.uuid4().hex[:24]}", 'object': 'batch', 'endpoint': request.get('endpoint'),
+                 'input_file_id': request['input_file_id'], 'completion_window': request.get('completion_window'),
+                 'status': 'in_progress', 'created_at': int(time.time()), 'output_file_id': None,
+                 'error_file_id': None, 'errors': None,
+                 'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0}}
+        with self._lock:
+            self.batches[batch['id']] = batch
+        threading.Thread(target=self._run_batch, args=(batch, lines), daemon=True).start()
+        return 200, dict(batch)
+
+    def batch(self, batch_id):
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            return dict(batch, request_counts=dict(batch['request_counts'])) if batch else None
+
+    def _run_batch(self, batch, lines):
+        def run(line):
+            status, _, body = self.respond(line['body'])
+            self._count(status)
+            with self._lock:
+                batch['request_counts']['completed' if status == 200 else 'failed'] += 1
+            return {'id': f"batch_req_{uuid.uuid4().hex[:24]}", 'custom_id': line['custom_id'],
+                    'response': {'status_code': status, 'request_id': uuid.uuid4().hex, 'body': body},
+                    'error': None}
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(run, lines))
+        output = [r for r in results if r['response']['status_code'] == 200]
+        errors = [r for r in results if r['response']['status_code'] != 200]
+        output_file = self.add_file("".join(json.dumps(r) + "\n" for r in output).encode('utf-8'),
+                                    f"{batch['id']}_output.jsonl", 'batch_output')
+        error_file = self.add_file("".join(json.dumps(r) + "\n" for r in errors).encode('utf-8'),
+                                   f"{batch['id']}_error.jsonl", 'batch_output') if errors else None
+        with self._lock:
+            batch.update(status='completed', completed_at=int(time.time()), output_file_id=output_file['id'],
+                         error_file_id=error_file['id'] if error_file else None)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _not_found(self):
+                self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+
+            def do_GET(self):
+                path = self.path.rstrip('/')
+                content = re.search(r'/files/([^/]+)/content$', path)
+                batch = re.search(r'/batches/([^/]+)$', path)
+                if path.endswith('/stats'):
+                    self._send_json(200, mock.stats())
+                elif content and content.group(1) in mock.files:
+                    data = mock.files[content.group(1)]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                elif batch and mock.batch(batch.group(1)):
+                    self._send_json(200, mock.batch(batch.group(1)))
+                else:
+                    self._not_found()
+
+            def _upload(self, data):
+                # multipart/form-data with a `file` and a `purpose` field, as the SDK sends it
+                message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('utf-8') + data)
+                fields = {part.get_param('name', header='content-disposition'): part
+                          for part in message.iter_parts()}
+                upload = fields['file']
+                self._send_json(200, mock.add_file(upload.get_payload(decode=True), upload.get_filename() or '',
+                                                   fields['purpose'].get_content().strip()))
+
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                path = self.path.rstrip('/')
+                if path.endswith('/files'):
+                    self._upload(data)
+                    return
+                if path.endswith('/batches'):
+                    self._send_json(*mock.create_batch(json.loads(data)))
+                    return
+                if not path.endswith('/chat/completions'):
+                    self._not_found()
+                    return
+                status, headers, body = mock.respond(json.loads(data or b'{}'))
+                mock._count(status)
+                if status != 200 or not isinstance(body, list):
+                    self._send_json(status, body, headers)
+                    return
+                # Streams have no Content-Length, so the connection ends with the response
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for event in body:
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.05, help="median response latency in seconds (default: 0.05)")
+    parser.add_argument('--latency-sigma', type=float, default=0.5,
+                        help="log-normal spread of the latency; 0 makes it constant (default: 0.5)")
+    parser.add_argument('--tokens-per-second', type=float, default=0,
+                        help="simulated generation speed added to the latency (default: off)")
+    parser.add_argument('--completion-tokens', type=int, default=300, help="tokens per response (default: 300)")
+    parser.add_argument('--error-429', type=float, default=0.0, help="probability of an injected 429 (default: 0)")
+    parser.add_argument('--error-5xx', type=float, default=0.0, help="probability of an injected 500 (default: 0)")
+    parser.add_argument('--server-rpm', type=int, help="server-side requests-per-minute limit (default: none)")
+    parser.add_argument('--server-tpm', type=int, help="server-side tokens-per-minute limit (default: none)")
+    parser.add_argument('--seed', type=int, help="random seed for reproducible latency and errors")
+
+
+def server_from_args(args, port=0):
+    return MockLLMServer(port=port, latency=args.latency, latency_sigma=args.latency_sigma,
+                         tokens_per_second=args.tokens_per_second, completion_tokens=args.completion_tokens,
+                         error_429=args.error_429, error_5xx=args.error_5xx, rpm=args.server_rpm,
+                         tpm=args.server_tpm, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible server for load tests.")
+    parser.add_argument('--port', type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    server = server_from_args(args, args.port).start()
+    print(f"Mock LLM server on {server.url} - point OPENAI_BASE_URL or batch_api.py --base-url at it. Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
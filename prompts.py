@@ -0,0 +1,423 @@
+# Prompt templates for every listing section, shared by the Streamlit app and the batch CLI
+import hashlib
+import json
+
+from token_budget import fit_inputs
+
+
+def title_prompt(product_info):
+    return f"""
+Write an Amazon product title (max 200 characters) for a high-converting listing.
+Use this format: Brand + Product Type + Keywords + Claims.
+Do not include size, weight, or volume in the title.
+
+Product: {product_info['Product Name']}
+Brand: {product_info['Brand Name']}
+USPs: {product_info['USPs Front']}
+Ingredients: {product_info['Ingredients']}
+Claims: {product_info['Claims']}
+"""
+
+
+def bullets_prompt(product_info):
+    return f"""
+Write 7 optimized Amazon bullet points. Each bullet should follow this format:
+BENEFIT IN CAPS: Followed by a clear, compelling benefit (250–300 characters).
+
+Avoid mentioning price, value for money, discounts, or any numerical cost-related details. Focus only on features, results, usage, or ingredient benefits.
+
+Product: {product_info['Product Name']}
+Brand: {product_info['Brand Name']}
+USPs: {product_info['USPs Front']}
+Ingredients: {product_info['Ingredients']}
+Claims: {product_info['Claims']}
+How to Use: {product_info['How to use it?']}
+Pack Contains: {product_info['Particulars']}
+MRP: ₹{product_info['MRP']}
+            """
+
+
+def description_prompt(product_info):
+    return f"""
+Write an Amazon HTML product description (max 400 words).
+Use 2 paragraphs, <p> and <br> tags for light formatting.
+
+Product: {product_info['Product Name']}
+Brand: {product_info['Brand Name']}
+USPs: {product_info['USPs Front']}
+Ingredients: {product_info['Ingredients']}
+Claims: {product_info['Claims']}
+How to Use: {product_info['How to use it?']}
+            """
+
+
+def shopify_prompt(product_info):
+    return f"""
+Write a Shopify product description using a friendly, informative tone.
+Include small paragraphs, bullet points, and headings. Length: 1500–2000 characters.
+
+Product: {product_info['Product Name']}
+Brand: {product_info['Brand Name']}
+USPs: {product_info['USPs Front']}
+Ingredients: {product_info['Ingredients']}
+Claims: {product_info['Claims']}
+How to Use: {product_info['How to use it?']}
+Pack Contains: {product_info['Particulars']}
+MRP: ₹{product_info['MRP']}
+            """
+
+
+# Brands with a hero image brief: Urbanyog (beauty) and MakeMeeBold (electronics)
+HERO_BRANDS = ('Urbanyog', 'MakeMeeBold')
+
+
+def hero_prompt(product_info):
+    if product_info['Brand Name'] == "Urbanyog":
+        return f"""
+                    Generate a series of 7 hero image prompts for a beauty product, each designed to be a standalone visual in the following sequence.  
+                    Each image must be exactly 1500 x 1500 pixels. For each image, include specific visual/creative directions as outlined.
+
+                    1. Hero Image: What does it do / Differentiation / Before-After  
+                    - Show the product with a clear before-and-after comparison, highlighting the main benefit or transformation.  
+                    - Use high-resolution, professional imagery with a clean, softly colored, on-brand background.  
+                    - Overlay concise benefit-driven text or icons.  
+                    - Ensure the product is the main focal point.
+
+                    2. USP  
+                    - Focus on the unique selling proposition that sets this product apart.  
+                    - Use bold text or a badge to highlight the USP.  
+                    - Incorporate lifestyle or in-use imagery for emotional connection.
+
+                    3. Ingredients & Their Use  
+                    - Visually showcase key ingredients with small icons or illustrations.  
+                    - Briefly mention each ingredient’s benefit.  
+                    - Use a soft, inviting color palette.
+
+                    4. Science Behind USP  
+                    - Include science-related visuals (molecules, lab glassware, dermatologist icons) to reinforce efficacy.  
+                    - Overlay a short, clear explanation of the science behind the USP.
+
+                    5. Comparison / Do's and Don'ts  
+                    - Create a side-by-side comparison with alternatives or a clear Do’s and Don’ts visual.  
+                    - Use simple icons and minimal text for clarity.
+
+                    6. How to Use  
+                    - Present step-by-step usage instructions in 3–4 crisp, numbered icons or steps.  
+                    - Keep instructions short, clear, and visually engaging.
+
+                    7. Safe for All Hair/Skin Types  
+                    - Use icons or imagery showing diversity in models (different skin/hair types).  
+                    - Add a clear statement or badge indicating suitability for all.
+
+                    General Visual/Creative Directions for All Images:  
+                    - Each image must be exactly 1500 x 1500 pixels.  
+                    - Use high-resolution, professional images.  
+                    - Clean, uncluttered, on-brand backgrounds.  
+                    - Overlay concise, benefit-driven text or icons.  
+                    - Maintain a consistent style, color palette, and font across all images.  
+                    - Optimize for both desktop and mobile screens.  
+                    - Avoid clutter; keep visuals focused and easy to scan.  
+                    - Do not include any call-to-action (CTA) buttons.  
+                    - Include relevant props that complement the product and provide context, without distracting from the main subject.  
+                    - Feature models where appropriate, ensuring diversity in skin and hair types to show inclusivity and real-world results.  
+                    - Use professional lighting setups (such as three-point lighting, softboxes, umbrellas, or ring lights) for soft, even illumination and to minimize harsh shadows.  
+                    - Capture the product from optimal angles, including close-ups for detail and lifestyle shots for context.  
+                    - Ensure the product is always the main focal point, with props and models used to enhance the story.
+
+                    Product details:  
+                    Product: {product_info['Product Name']}  
+                    USP: {product_info['USPs Front']}  
+                    Ingredients: {product_info['Ingredients']}  
+                    How to use: {product_info['How to use it?']}  
+                    Target: {product_info.get('Target Audience', '')}  
+                    Other details: {product_info.get('Other details', '')}
+                    """
+    elif product_info['Brand Name'] == "MakeMeeBold":
+        return f"""
+                Generate a series of 7 hero image prompts for an electronics product, each designed to be a standalone visual in the following sequence.  
+                Each image must be exactly 1500 x 1500 pixels. For each image, include specific visual/creative directions as outlined.
+
+                1. Hero Image: What does it do / Differentiation / Before-After  
+                - Show the product in action or with a before-and-after or comparison visual.  
+                - Use high-resolution, professional imagery with a clean, on-brand background.  
+                - Overlay concise benefit-driven text or icons.
+
+                2. Main USP  
+                - Highlight the primary unique selling point with bold text or a badge.  
+                - Use dynamic angles and close-ups to draw attention.
+
+                3. Other USPs  
+                - Present additional USPs or features with icons or short text.  
+                - Arrange features for easy scanning.
+
+                4. Comparison  
+                - Create a side-by-side comparison with other products or brands.  
+                - Use simple graphics and minimal text.
+
+                5. How to Use  
+                - Show 2–4 easy-to-follow steps or icons for product usage.  
+                - Keep instructions short and visually engaging.
+
+                6. All Hair Type (if relevant)  
+                - Use a badge or icon to indicate compatibility with all hair types (for grooming devices).  
+                - Show diverse models if applicable.
+
+                7. What's in the Box / Customer Care  
+                - Display all included accessories in a neat flat-lay or organized arrangement.  
+                - Add customer care contact or warranty info in a clear, non-intrusive way.
+
+                General Visual/Creative Directions for All Images:  
+                - Each image must be exactly 1500 x 1500 pixels.  
+                - Use high-resolution, professional images.  
+                - Clean, uncluttered, on-brand backgrounds.  
+                - Overlay concise, benefit-driven text or icons.  
+                - Consistent style, color palette, and font across all images.  
+                - Optimize for both desktop and mobile screens.  
+                - Avoid clutter; keep visuals focused and easy to scan.  
+                - Do not include any call-to-action (CTA) buttons.  
+                - Include relevant props that complement the product and provide context, without distracting from the main subject.  
+                - Feature models where appropriate (e.g., for scale or lifestyle context).  
+                - Use professional lighting setups (such as three-point lighting, softboxes, umbrellas, or ring lights) for soft, even illumination and to minimize harsh shadows.  
+                - Capture the product from optimal angles, including close-ups for detail and lifestyle shots for context.  
+                - Ensure the product is always the main focal point, with props and models used to enhance the story.
+
+                Product details:  
+                Product: {product_info['Product Name']}  
+                Main USP: {product_info['USPs Front']}  
+                Other USPs: {product_info.get('Other USPs', '')}  
+                How to use: {product_info['How to use it?']}  
+                Box contents: {product_info.get('Particulars', '')}  
+                Customer care: {product_info.get('Customer Care', '')}  
+                Other details: {product_info.get('Other details', '')}
+                """
+    else:
+        raise ValueError(unsupported_reason('hero', product_info))
+
+
+def a_plus_prompt(product_info):
+    return f"""
+Generate 7 Amazon A+ content image prompts in this format:
+
+Image 1:
+• Visual: 1464x600 (desktop) / 600x450 (mobile). Clean layout, brand, benefits.
+• Text: Marketing headline
+• Supporting Text: Short supporting copy
+
+Product: {product_info['Product Name']}
+USPs: {product_info['USPs Front']}
+How to Use: {product_info['How to use it?']}
+Claims: {product_info['Claims']}
+Ingredients: {product_info['Ingredients']}
+            """
+
+
+def web_full_prompt(product_info):
+    return f"""
+Generate the following website content in a structured format:
+
+1. 7 Bullet Points – focus on customer benefits, pain points, or product uniqueness.
+2. Description – 2 paragraphs, warm and benefit-driven tone, max 400 words.
+3. USP Points – concise value-driven phrases (2–4 words each).
+4. What do you get – brief explanation of what comes in the package.
+5. How to use – easy-to-follow, friendly, step-by-step instructions.
+6. 6 FAQs – with short, helpful answers.
+7. 15 Customer Reviews – first 2 as story-style testimonials, remaining 13 as short user opinions.
+
+Product Name: {product_info['Product Name']}
+Brand: {product_info['Brand Name']}
+USPs / Features: {product_info['USPs Front']}
+Ingredients: {product_info['Ingredients']}
+Claims: {product_info['Claims']}
+How to Use: {product_info['How to use it?']}
+What’s Included: {product_info['Particulars']}
+MRP: ₹{product_info['MRP']}
+            """
+
+
+def web_bullets_prompt(product_info):
+    return f"""
+Write 7 bullet points for website use. Each point should focus on product benefits, customer problems, or emotional triggers.
+
+Product: {product_info['Product Name']}
+USPs: {product_info['USPs Front']}
+"""
+
+
+def web_description_prompt(product_info):
+    return f"""
+Write a product description for the website (max 400 words). Use a warm, benefit-oriented tone and structure it with two paragraphs.
+
+Product: {product_info['Product Name']}
+USPs: {product_info['USPs Front']}
+Claims: {product_info['Claims']}
+Ingredients: {product_info['Ingredients']}
+"""
+
+
+def usp_prompt(product_info):
+    return f"""
+Generate exactly 6 concise USPs for a product listing.
+Guidelines:
+- Each USP must be a short, impactful phrase of 2–4 words.
+- Do not include full sentences.
+- Do not include explanations.
+- Format strictly as a bullet list like:
+  - Frizz-control Formula
+  - Lightweight & Non-Greasy
+  - Safe for Daily Use
+
+Product: {product_info['Product Name']}
+USPs: {product_info['USPs Front']}
+"""
+
+
+def what_you_get_prompt(product_info):
+    return f"""
+Describe what the customer will receive when they purchase the product. Mention packaging, quantity, and any bonuses.
+
+Product: {product_info['Product Name']}
+"""
+
+
+def how_to_use_prompt(product_info):
+    return f"""
+Describe how to use this product step-by-step in a friendly, instructional tone.
+
+Product: {product_info['Product Name']}
+Instructions: {product_info['How to use it?']}
+"""
+
+
+def faqs_prompt(product_info):
+    return f"""
+Write 6 frequently asked questions and concise answers for this Amazon product listing.
+Guidelines:
+- Do NOT include questions about certifications, result timelines, or return/refund policies.
+- Avoid questions like "What is it?" or "How do I use it?" since those are covered elsewhere.
+- Focus on practical use, compatibility, safety (general, not certifications), storage, frequency, product care, and common customer concerns.
+- Keep answers under 150 characters.
+- Use clear, customer-friendly language.
+- Naturally include relevant keywords where possible, but do not keyword stuff.
+- Do not mention price, promotions, or other brands.
+
+Product: {product_info['Product Name']}
+Key Features: {product_info['USPs Front']}
+Ingredients: {product_info['Ingredients']}
+How to Use: {product_info['How to use it?']}
+
+"""
+
+
+def reviews_prompt(product_info):
+    return f"""
+Write 15 customer reviews for this product.
+- The first 2 should be long story-style testimonials.
+- The remaining 13 should be short, specific, and highlight different use cases or outcomes.
+- All reviewer names should sound authentic and be common Indian names.
+
+Product: {product_info['Product Name']}
+"""
+
+
+PROMPTS = {
+    'title': title_prompt,
+    'bullets': bullets_prompt,
+    'description': description_prompt,
+    'shopify': shopify_prompt,
+    'hero': hero_prompt,
+    'a_plus': a_plus_prompt,
+    'web_full': web_full_prompt,
+    'web_bullets': web_bullets_prompt,
+    'web_description': web_description_prompt,
+    'usp': usp_prompt,
+    'what_you_get': what_you_get_prompt,
+    'how_to_use': how_to_use_prompt,
+    'faqs': faqs_prompt,
+    'reviews': reviews_prompt,
+}
+
+# Human-readable names used in error messages
+SECTION_NAMES = {
+    'title': "title",
+    'bullets': "bullet points",
+    'description': "description",
+    'shopify': "Shopify description",
+    'hero': "hero image prompts",
+    'a_plus': "A+ image prompts",
+    'web_full': "Website Content",
+    'web_bullets': "website bullets",
+    'web_description': "website description",
+    'usp': "USP",
+    'what_you_get': "What Do You Get",
+    'how_to_use': "How to Use",
+    'faqs': "FAQs",
+    'reviews': "Reviews",
+}
+
+# Sections produced for every product in batch mode. 'web_full' is left out
+# because it repeats the individual website sections in a single blob.
+SECTIONS = [
+    'title', 'bullets', 'description', 'shopify', 'hero', 'a_plus',
+    'web_bullets', 'web_description', 'usp', 'what_you_get', 'how_to_use',
+    'faqs', 'reviews',
+]
+
+
+# KLD fields each prompt reads; a section only needs regenerating when one of these changes
+SECTION_FIELDS = {
+    'title': ['Product Name', 'Brand Name', 'USPs Front', 'Ingredients', 'Claims'],
+    'bullets': ['Product Name', 'Brand Name', 'USPs Front', 'Ingredients', 'Claims', 'How to use it?',
+                'Particulars', 'MRP'],
+    'description': ['Product Name', 'Brand Name', 'USPs Front', 'Ingredients', 'Claims', 'How to use it?'],
+    'shopify': ['Product Name', 'Brand Name', 'USPs Front', 'Ingredients', 'Claims', 'How to use it?',
+                'Particulars', 'MRP'],
+    'hero': ['Brand Name', 'Product Name', 'USPs Front', 'Other USPs', 'Ingredients', 'How to use it?',
+             'Target Audience', 'Particulars', 'Customer Care', 'Other details'],
+    'a_plus': ['Product Name', 'USPs Front', 'How to use it?', 'Claims', 'Ingredients'],
+    'web_full': ['Product Name', 'Brand Name', 'USPs Front', 'Ingredients', 'Claims', 'How to use it?',
+                 'Particulars', 'MRP'],
+    'web_bullets': ['Product Name', 'USPs Front'],
+    'web_description': ['Product Name', 'USPs Front', 'Claims', 'Ingredients'],
+    'usp': ['Product Name', 'USPs Front'],
+    'what_you_get': ['Product Name'],
+    'how_to_use': ['Product Name', 'How to use it?'],
+    'faqs': ['Product Name', 'USPs Front', 'Ingredients', 'How to use it?'],
+    'reviews': ['Product Name'],
+}
+
+
+def fitted_inputs(section, product_info):
+    # Compacts the fields the section reads and trims them to the input token budget
+    return fit_inputs(section, product_info, SECTION_FIELDS[section])
+
+
+def unsupported_reason(section, product_info):
+    """Why `section` can't be generated for this product, or None if it can."""
+    if section == 'hero' and product_info.get('Brand Name') not in HERO_BRANDS:
+        return (f"No hero image brief for brand '{product_info.get('Brand Name')}' "
+                f"(supported: {', '.join(HERO_BRANDS)})")
+    return None
+
+
+def build_prompt(section, product_info):
+    # Raises ValueError for a section that has no prompt for this product, so nothing is sent to the model
+    reason = unsupported_reason(section, product_info)
+    if reason:
+        raise ValueError(reason)
+    return PROMPTS[section](fitted_inputs(section, product_info))
+
+
+def json_default(value):
+    # numpy / pandas scalars coming from DataFrame rows
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def section_inputs(section, product_info, structured_web=False):
+    # The structured website call reads the same fields as the full website prompt
+    fields = SECTION_FIELDS['web_full' if structured_web else section]
+    return {field: product_info.get(field) for field in fields}
+
+
+def inputs_fingerprint(section, inputs, structured_web=False):
+    payload = json.dumps([section, structured_web, inputs], sort_keys=True, default=json_default)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
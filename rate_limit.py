@@ -0,0 +1,59 @@
+# Client-side token bucket limiter for requests-per-minute and tokens-per-minute budgets
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """Two token buckets (requests and tokens) that refill continuously.
+
+    The lock is a plain threading lock that is never held across an await,
+    so one limiter can be shared by every event loop and thread in the process.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _try_acquire(self, tokens):
+        # Returns 0 when the request may go ahead, otherwise the seconds to wait
+        tokens = min(tokens, self.tpm)
+        with self._lock:
+            self._refill()
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return 0
+            return max((1 - self._requests) * 60 / self.rpm,
+                       (tokens - self._tokens) * 60 / self.tpm)
+
+    async def acquire(self, tokens):
+        while True:
+            delay = self._try_acquire(tokens)
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def acquire_blocking(self, tokens):
+        while True:
+            delay = self._try_acquire(tokens)
+            if not delay:
+                return
+            time.sleep(delay)
+
+    def adjust(self, estimated, actual):
+        # Charge or refund the difference once the real token usage is known
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.tpm, self._tokens + estimated - actual)
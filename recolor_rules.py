@@ -0,0 +1,120 @@
+# Rule-driven recoloring of print designs per garment colour: rules compile to lookup tables, images run in strips
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_RULES_PATH = os.getenv("GARMENT_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "garment_rules.json"))
+# Rows per strip: per-pixel working arrays never exceed this many rows
+DEFAULT_STRIP_ROWS = 512
+# Rule matches are bits of a uint16
+MAX_RULES = 16
+
+_masks = np.arange(2 ** MAX_RULES)
+# _FIRST_RULE[mask] is 1 + the index of the lowest set bit, i.e. the first matching rule, or 0 for none
+_FIRST_RULE = np.where(_masks > 0, np.log2(np.maximum(_masks & -_masks, 1)) + 1, 0).astype(np.uint8)
+# An RGBA pixel viewed as one uint32, with only its alpha byte set
+_ALPHA = np.array([0, 0, 0, 255], dtype=np.uint8).view(np.uint32)[0]
+
+
+def rule_bounds(rule):
+    """Return the inclusive (low, high) RGB bounds of the pixels `rule` recolors.
+
+    - light: every channel above `threshold` (near-white)
+    - dark: every channel below `threshold` (near-black)
+    - swap: every channel within `tolerance` of `from` (a palette colour)
+    - range: every channel between `min` and `max`
+    """
+    kind = rule.get('type')
+    if kind == 'light':
+        return [rule['threshold'] + 1] * 3, [255] * 3
+    if kind == 'dark':
+        return [0] * 3, [rule['threshold'] - 1] * 3
+    if kind == 'swap':
+        tolerance = rule.get('tolerance', 0)
+        return [c - tolerance for c in rule['from']], [c + tolerance for c in rule['from']]
+    if kind == 'range':
+        return rule['min'], rule['max']
+    raise ValueError(f"Unknown recolor rule type {kind!r}")
+
+
+class RuleSet:
+    """Ordered rules compiled to per-channel lookup tables; a pixel takes the `color` of the first rule it matches.
+
+    Bit i of `channel_masks[c][v]` says whether value v of channel c is inside
+    rule i's bounds, so a pixel's matching rules are three table lookups ANDed
+    together however many rules there are. Alpha is never changed.
+    """
+
+    def __init__(self, rules):
+        if not rules or len(rules) > MAX_RULES:
+            raise ValueError(f"A rule set needs 1 to {MAX_RULES} rules, got {len(rules)}")
+        self.rules = rules
+        # Identifies the rules themselves, so outputs made with other rules can be told apart
+        self.fingerprint = hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:16]
+        self.channel_masks = np.zeros((3, 256), dtype=np.uint16)
+        self.palette = np.zeros((len(rules) + 1, 3), dtype=np.uint8)
+        values = np.arange(256)
+        for i, rule in enumerate(rules):
+            low, high = rule_bounds(rule)
+            for channel in range(3):
+                self.channel_masks[channel][(values >= low[channel]) & (values <= high[channel])] |= 1 << i
+            self.palette[i + 1] = rule['color']
+        # The palette as RGBA words with alpha 0, so a pixel is recolored with one OR
+        rgba = np.zeros((len(self.palette), 4), dtype=np.uint8)
+        rgba[:, :3] = self.palette
+        self.packed_palette = rgba.view(np.uint32).ravel()
+
+    def apply(self, pixels):
+        """Recolor a C-contiguous (h, w, 4) uint8 RGBA array in place."""
+        masks = self.channel_masks
+        matched = masks[0][pixels[..., 0]] & masks[1][pixels[..., 1]] & masks[2][pixels[..., 2]]
+        rule = _FIRST_RULE[matched]
+        words = pixels.view(np.uint32)[..., 0]
+        np.copyto(words, (words & _ALPHA) | self.packed_palette[rule], where=rule > 0)
+
+
+@functools.lru_cache(maxsize=8)
+def _load(path, mtime):
+    with open(path, encoding='utf-8') as f:
+        return {garment: RuleSet(rules) for garment, rules in json.load(f).items()}
+
+
+def load_rule_sets(path=DEFAULT_RULES_PATH):
+    """Compiled rule sets by garment colour from a JSON config of {"garment": [rule, ...]}; reloaded when edited."""
+    return _load(path, os.path.getmtime(path))
+
+
+def rule_set_for(garment, path=DEFAULT_RULES_PATH):
+    rule_sets = load_rule_sets(path)
+    if garment not in rule_sets:
+        raise KeyError(f"No recolor rules for {garment!r} garments in {path}; known: {', '.join(sorted(rule_sets))}")
+    return rule_sets[garment]
+
+
+def remap_in_place(img, rule_set, strip_rows=DEFAULT_STRIP_ROWS):
+    """Recolor an RGBA image strip by strip, so working memory is bounded by the strip, not the image."""
+    for top in range(0, img.height, strip_rows):
+        box = (0, top, img.width, min(top + strip_rows, img.height))
+        strip = np.array(img.crop(box))
+        rule_set.apply(strip)
+        img.paste(Image.fromarray(strip), box[:2])
+    return img
+
+
+def remap_image(img, rule_set, strip_rows=DEFAULT_STRIP_ROWS):
+    """Return a recolored RGBA copy of `img`."""
+    rgba = img.convert("RGBA") if img.mode != "RGBA" else img.copy()
+    return remap_in_place(rgba, rule_set, strip_rows)
+
+
+def recolor_for_garment(image_path, output_path, garment, path=DEFAULT_RULES_PATH):
+    rule_set = rule_set_for(garment, path)
+    with Image.open(image_path) as img:
+        # The opened file's pixels are ours, so an RGBA design is recolored without another copy
+        rgba = img.convert("RGBA") if img.mode != "RGBA" else img
+        remap_in_place(rgba, rule_set).save(output_path)
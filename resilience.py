@@ -0,0 +1,127 @@
+# Retries with jittered exponential backoff and hedged duplicate requests for slow LLM calls
+import asyncio
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "5"))
+_backoff = wait_random_exponential(multiplier=1, max=30)
+# Room for the most concurrent requests the app allows (64) plus a duplicate of each; threads start on demand
+_hedge_pool = ThreadPoolExecutor(max_workers=128, thread_name_prefix='hedge')
+
+
+def retryable(error):
+    # 429s, 5xx and timeouts/connection drops are transient; 4xx request errors are not
+    return isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError))
+
+
+def _wait(retry_state):
+    # Use the server's retry-after hint when it sends one, otherwise full-jitter backoff
+    response = getattr(retry_state.outcome.exception(), 'response', None)
+    if response is not None:
+        try:
+            if response.headers.get('retry-after-ms'):
+                return float(response.headers['retry-after-ms']) / 1000
+            if response.headers.get('retry-after'):
+                return float(response.headers['retry-after'])
+        except ValueError:
+            pass
+    return _backoff(retry_state)
+
+
+def _retry_options():
+    return dict(stop=stop_after_attempt(MAX_ATTEMPTS), wait=_wait, retry=retry_if_exception(retryable), reraise=True)
+
+
+def call_with_retries(fn):
+    """Call `fn()` until it succeeds or a non-retryable error is raised. Returns (result, retries)."""
+    retrying = Retrying(**_retry_options())
+    result = retrying(fn)
+    return result, retrying.statistics['attempt_number'] - 1
+
+
+async def acall_with_retries(fn):
+    retrying = AsyncRetrying(**_retry_options())
+    result = await retrying(fn)
+    return result, retrying.statistics['attempt_number'] - 1
+
+
+class HedgeBudget:
+    """Caps duplicate requests at `fraction` of all requests, e.g. 0.05 = at most 5% extra spend.
+
+    A fraction of 0 turns hedging off.
+    """
+
+    def __init__(self, fraction=float(os.getenv("LLM_HEDGE_BUDGET", "0"))):
+        self.fraction = fraction
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_hedge(self):
+        with self._lock:
+            if self.hedges + 1 > self.fraction * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+def hedged(fn, hedge_after, budget):
+    """Run `fn()`; if it is still running after `hedge_after` seconds, start a duplicate.
+
+    Returns (result, hedged) from whichever call finishes first. A failed
+    call falls back to the other one. The slower call cannot be interrupted
+    from another thread, so it runs to completion and its result is dropped.
+    """
+    budget.record_request()
+    if not hedge_after or not budget.fraction:
+        return fn(), False
+    started = threading.Event()
+
+    def primary():
+        started.set()
+        return fn()
+
+    first = _hedge_pool.submit(primary)
+    # Time spent queued for a pool thread isn't a slow request, so the clock starts when the call does
+    started.wait()
+    done, _ = wait([first], timeout=hedge_after)
+    if done or not budget.try_hedge():
+        return first.result(), False
+    second = _hedge_pool.submit(fn)
+    done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+    winner = done.pop()
+    if winner.exception() is not None:
+        winner = second if winner is first else first
+    return winner.result(), True
+
+
+async def ahedged(make_coro, hedge_after, budget):
+    """Async version of `hedged`; the slower request is cancelled, which closes its connection."""
+    budget.record_request()
+    if not hedge_after or not budget.fraction:
+        return await make_coro(), False
+    first = asyncio.ensure_future(make_coro())
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done or not budget.try_hedge():
+        return await first, False
+    second = asyncio.ensure_future(make_coro())
+    try:
+        done, _ = await asyncio.wait({first, second}, return_when=asyncio.FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None:
+            winner = second if winner is first else first
+            await asyncio.wait({winner})
+        return winner.result(), True
+    finally:
+        for task in (first, second):
+            if task.done() and not task.cancelled():
+                task.exception()  # marks a failed loser as handled
+            task.cancel()
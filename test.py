@@ -1,19 +1,20 @@
-from PIL import Image
+from recolor_rules import RuleSet, recolor_for_garment, remap_image
 
-def adjust_for_white_tshirt(image_path, output_path):
-    img = Image.open(image_path).convert("RGBA")
-    datas = img.getdata()
+# A pixel is "light" when all of R, G and B are above this
+LIGHT_THRESHOLD = 200
+DARK_GRAY = (30, 30, 30)
+
+
+def darken_light_pixels(img, threshold=LIGHT_THRESHOLD, color=DARK_GRAY):
+    """Return an RGBA copy of `img` with light pixels (e.g. white) set to `color`, keeping their alpha."""
+    return remap_image(img, RuleSet([{'type': 'light', 'threshold': threshold, 'color': list(color)}]))
 
-    new_data = []
-    for item in datas:
-        # Detect light colors (e.g., white) and replace with dark gray
-        if item[0] > 200 and item[1] > 200 and item[2] > 200:
-            new_data.append((30, 30, 30, item[3]))  # Dark gray
-        else:
-            new_data.append(item)
 
-    img.putdata(new_data)
-    img.save(output_path)
+def adjust_for_white_tshirt(image_path, output_path):
+    # The rules for each garment colour live in garment_rules.json
+    recolor_for_garment(image_path, output_path, 'white')
+
 
-# Example usage:
-adjust_for_white_tshirt('./3.png', 'adjusted_design.png')
+if __name__ == '__main__':
+    # Example usage:
+    adjust_for_white_tshirt('./3.png', 'adjusted_design.png')
@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
-import requests
+import time
 from datetime import datetime, timedelta
 
+import contact_sync
+from contact_matching import attribute_orders, compare_contacts, extract_retell_contacts, extract_shopify_contacts
+
 st.set_page_config(page_title="Retell vs Shopify Matcher", layout="wide")
 st.title("📞 Retell AI Calls vs Shopify Orders Match")
 
@@ -24,104 +27,57 @@ shopify_password = st.text_input("Shopify API Password", type="password")
 today = datetime.today()
 def_date = (today - timedelta(days=7), today)
 date_range = st.date_input("Select Date Range (based on call/order creation)", value=def_date)
+attribution = st.checkbox("Attribute each order to the latest call before it", value=False,
+                          help="Instead of listing every call/order pair that shares a contact.")
+lookback_hours = st.number_input("Look-back window (hours)", min_value=1, value=72, disabled=not attribution)
+sync_first = st.checkbox("Fetch new and changed calls/orders from the APIs first", value=True,
+                         help="Unticked, the comparison only uses what is already in the local store.")
+
+
+@st.cache_resource
+def http_session():
+    return contact_sync.make_session()
+
+
+@st.cache_resource
+def contact_store():
+    return contact_sync.ContactStore()
 
-# Comparison functions
-def extract_shopify_contacts(orders):
-    emails = set()
-    phones = set()
-    for order in orders:
-        created_at = order.get("created_at")
-        if created_at and not date_in_range(created_at):
-            continue
-        email = order.get("email") or order.get("contact_email")
-        if email:
-            emails.add(email.lower())
-        phone = order.get("phone")
-        if phone:
-            phones.add(phone.replace(" ", "").replace("-", "").lower())
-        customer = order.get("customer", {})
-        if customer:
-            if customer.get("email"):
-                emails.add(customer["email"].lower())
-            if customer.get("phone"):
-                phones.add(customer["phone"].replace(" ", "").replace("-", "").lower())
-    return {"emails": emails, "phones": phones}
-
-def extract_retell_contacts(calls):
-    contacts = []
-    for call in calls:
-        start_timestamp = call.get("start_timestamp")
-        if start_timestamp and not timestamp_in_range(start_timestamp):
-            continue
-        email = call.get("retell_llm_dynamic_variables", {}).get("email")
-        phone = call.get("to_number")
-        contacts.append({
-            "call_id": call.get("call_id"),
-            "email": email.lower() if email else None,
-            "phone": phone.replace(" ", "").replace("-", "").lower() if phone else None
-        })
-    return contacts
-
-def compare_contacts(retell_contacts, shopify_contacts_raw):
-    matched_results = []
-    for order in shopify_contacts_raw:
-        email = (order.get("email") or order.get("contact_email") or "").lower()
-        phone = (order.get("phone") or order.get("customer", {}).get("phone") or "").replace(" ", "").replace("-", "").lower()
-
-        for call in retell_contacts:
-            if (call["email"] and call["email"] == email) or (call["phone"] and call["phone"] == phone):
-                matched_results.append({
-                    "call_id": call["call_id"],
-                    "call_email": call["email"],
-                    "call_phone": call["phone"],
-                    "order_id": order.get("name"),
-                    "order_email": email,
-                    "order_phone": phone,
-                    "customer_name": order.get("customer", {}).get("first_name", "") + " " + order.get("customer", {}).get("last_name", "")
-                })
-    return matched_results
-
-def date_in_range(iso_date):
-    if not iso_date:
-        return False
-    try:
-        dt = datetime.fromisoformat(iso_date.replace("Z", "+00:00"))
-        return date_range[0] <= dt.date() <= date_range[1]
-    except:
-        return False
-
-def timestamp_in_range(ms_timestamp):
-    dt = datetime.utcfromtimestamp(ms_timestamp / 1000)
-    return date_range[0] <= dt.date() <= date_range[1]
 
 # Fetch and compare
 if st.button("🔍 Compare Calls with Orders"):
     if not (retell_api_url and shopify_api_url and retell_api_key and shopify_api_key and shopify_password):
         st.error("Please fill in all fields.")
     else:
-        with st.spinner("Fetching data from APIs..."):
+        with st.spinner("Syncing calls and orders..."):
             try:
-                # Retell API call using POST
-                headers_retell = {
-                    "Authorization": f"Bearer {retell_api_key}",
-                    "Content-Type": "application/json"
-                }
-                retell_response = requests.post(retell_api_url, headers=headers_retell, json={})
-                retell_response.raise_for_status()
-                retell_data_raw = retell_response.json()
-                retell_data = retell_data_raw if isinstance(retell_data_raw, list) else retell_data_raw.get("calls", [])
-
-                # Shopify API call
-                auth = (shopify_api_key, shopify_password)
-                shopify_response = requests.get(shopify_api_url, auth=auth)
-                shopify_response.raise_for_status()
-                shopify_data = shopify_response.json()
-
-                shopify_contacts = extract_shopify_contacts(shopify_data.get("orders", []))
+                store = contact_store()
+                start_date, end_date = date_range[0], date_range[-1]
+                # Calls from before the range can still be credited with orders inside it
+                calls_from = start_date - timedelta(days=-(-lookback_hours // 24)) if attribution else start_date
+                if sync_first:
+                    # Only what the local store doesn't have yet is fetched; date filters run on the servers
+                    session = http_session()
+                    started = time.perf_counter()
+                    stats = contact_sync.FetchStats()
+                    contact_sync.sync_retell(store, session, retell_api_url, retell_api_key, calls_from, stats)
+                    contact_sync.sync_shopify(store, session, shopify_api_url, (shopify_api_key, shopify_password),
+                                              start_date, stats)
+                    st.caption(f"Fetched {stats.records} new or changed records in {stats.requests} requests "
+                               f"({stats.bytes / 1024:.0f} KB, {time.perf_counter() - started:.1f}s)")
+                retell_data = store.calls_between(calls_from, end_date)
+                orders = store.orders_between(start_date, end_date)
+
+                shopify_contacts = extract_shopify_contacts(orders, start_date, end_date)
                 retell_contacts = extract_retell_contacts(retell_data)
-                comparison_result = compare_contacts(retell_contacts, shopify_data.get("orders", []))
-
-                df = pd.DataFrame(comparison_result)
+                if attribution:
+                    df = attribute_orders(retell_contacts, orders, timedelta(hours=lookback_hours))
+                    if not df.empty:
+                        st.caption(f"{len(df)} of {len(orders)} orders attributed to a call, median "
+                                   f"{df['hours_to_conversion'].median():.1f}h from call to order")
+                else:
+                    comparison_result = compare_contacts(retell_contacts, orders)
+                    df = pd.DataFrame(comparison_result)
 
                 if df.empty:
                     st.warning("No matching data found. Double-check your API responses or date filter.")
@@ -0,0 +1,112 @@
+# Token counting and per-section input budgets: compact KLD cells and trim the largest ones to fit
+import functools
+import os
+import re
+import threading
+from collections import defaultdict
+
+DEFAULT_INPUT_BUDGET = int(os.getenv("PROMPT_INPUT_BUDGET", "800"))
+# Trimming never cuts a field below this many tokens
+MIN_FIELD_TOKENS = 20
+# Split points for list-like cells
+_ITEM_END = re.compile(r"(?<=[,;\n])")
+# Cells that are lists of items, where a repeated item carries nothing new. Prose such as
+# 'How to use it?' legitimately repeats clauses, so it is never de-duplicated
+LIST_FIELDS = ('Ingredients', 'USPs Front')
+
+_lock = threading.Lock()
+savings = defaultdict(lambda: {'prompts': 0, 'trimmed': 0, 'tokens_before': 0, 'tokens_after': 0})
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    # tiktoken is optional; without it (or without its downloadable BPE file) counts fall back to ~4 chars/token
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def compact(text, dedupe_items=False):
+    """Collapse runs of spaces and blank lines; with `dedupe_items`, also drop repeated list items."""
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    text = "\n".join(line for line in lines if line)
+    if not dedupe_items:
+        return text
+    seen = set()
+    items = []
+    for item in _ITEM_END.split(text):
+        key = item.strip(" ,;\n").lower()
+        if key and key in seen:
+            continue
+        seen.add(key)
+        items.append(item)
+    return "".join(items).strip(" ,;\n")
+
+
+def truncate(text, max_tokens):
+    # Keep whole list items where possible, otherwise cut on a word boundary
+    kept = []
+    for item in _ITEM_END.split(text):
+        if count_tokens("".join(kept) + item) > max_tokens:
+            break
+        kept.append(item)
+    if kept:
+        return "".join(kept).strip(" ,;\n")
+    words = text.split()
+    while words and count_tokens(" ".join(words)) > max_tokens:
+        words = words[:max(1, len(words) * 3 // 4)] if len(words) > 1 else []
+    return " ".join(words)
+
+
+def fit_inputs(section, product_info, fields, budget=DEFAULT_INPUT_BUDGET):
+    """Return a copy of `product_info` whose `fields` fit in `budget` tokens, and record the saving.
+
+    Whitespace in text cells is always collapsed. Over budget, repeated items
+    in LIST_FIELDS are dropped, and if that is not enough the largest field
+    is trimmed first, down to MIN_FIELD_TOKENS at most.
+    """
+    texts = {field: product_info.get(field) for field in fields if isinstance(product_info.get(field), str)}
+    before = sum(count_tokens(text) for text in texts.values())
+    texts = {field: compact(text) for field, text in texts.items()}
+    sizes = {field: count_tokens(text) for field, text in texts.items()}
+    if sum(sizes.values()) > budget:
+        for field in texts.keys() & set(LIST_FIELDS):
+            texts[field] = compact(texts[field], dedupe_items=True)
+            sizes[field] = count_tokens(texts[field])
+    trimmed = False
+    while sizes and sum(sizes.values()) > budget:
+        field = max(sizes, key=sizes.get)
+        target = max(MIN_FIELD_TOKENS, sizes[field] - (sum(sizes.values()) - budget))
+        if target >= sizes[field]:
+            break
+        texts[field] = truncate(texts[field], target)
+        sizes[field] = count_tokens(texts[field])
+        trimmed = True
+
+    with _lock:
+        stats = savings[section]
+        stats['prompts'] += 1
+        stats['trimmed'] += trimmed
+        stats['tokens_before'] += before
+        stats['tokens_after'] += sum(sizes.values())
+
+    fitted = product_info.copy()
+    for field, text in texts.items():
+        fitted[field] = text
+    return fitted
+
+
+def savings_report():
+    with _lock:
+        rows = [{'section': section, **stats, 'saved': stats['tokens_before'] - stats['tokens_after']}
+                for section, stats in sorted(savings.items())]
+    return rows
@@ -0,0 +1,127 @@
+# Grouping of near-duplicate KLD rows (same product in another size or pack) so each group is generated once
+import re
+import zlib
+
+import numpy as np
+
+from prompts import SECTION_FIELDS, json_default
+
+# Fields that legitimately differ between variants of one product
+VARIANT_FIELDS = ['SKU', 'Net Weight', 'Particulars', 'MRP']
+CORE_FIELDS = sorted({field for fields in SECTION_FIELDS.values() for field in fields} - set(VARIANT_FIELDS))
+DEFAULT_THRESHOLD = 0.9
+NUM_PERM = 64
+BANDS = 16
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_CURRENCY = r"(?:₹|rs\.?|inr|mrp:?)\s*"
+# Sizes and pack counts, e.g. "30 ml", "1.5kg", "pack of 3", "2 x"
+_SIZE = re.compile(r"\b(?:pack of \d+|\d+(?:\.\d+)?\s*(?:ml|l|ltr|litre|g|gm|gms|kg|mg|oz|pcs|pieces|pack|x)\b)")
+
+
+def _blank(value):
+    return value is None or (isinstance(value, float) and value != value) or str(value).strip() == ''
+
+
+def normalize(value):
+    if _blank(value):
+        return ''
+    text = _SIZE.sub(' ', str(value).lower())
+    return ' '.join(re.findall(r"[a-z0-9%]+", text))
+
+
+def core_text(product_info):
+    return ' | '.join(normalize(product_info.get(field)) for field in CORE_FIELDS)
+
+
+def minhash(text):
+    words = text.split()
+    shingles = {' '.join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A * (hashes[None, :] % _PRIME) + _B) % _PRIME).min(axis=1)
+
+
+def cluster_products(products, threshold=DEFAULT_THRESHOLD):
+    """Map each product (by position) to the position of its group's representative.
+
+    Rows with identical core fields (everything but size, pack and price) are
+    always grouped. With `threshold` below 1, rows whose core text has an
+    estimated Jaccard similarity of at least `threshold` (MinHash + LSH over
+    word 3-grams) are grouped too. The first row of a group represents it.
+    """
+    parent = list(range(len(products)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        i, j = find(i), find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    exact = {}
+    for position, product_info in enumerate(products):
+        text = core_text(product_info)
+        if text in exact:
+            union(exact[text], position)
+        else:
+            exact[text] = position
+
+    if threshold < 1 and len(exact) > 1:
+        positions = list(exact.values())
+        signatures = np.stack([minhash(text) for text in exact])
+        rows = NUM_PERM // BANDS
+        for band in range(BANDS):
+            buckets = {}
+            for index, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+                buckets.setdefault(key, []).append(index)
+            for members in buckets.values():
+                for other in members[1:]:
+                    if find(positions[members[0]]) != find(positions[other]) and \
+                            np.mean(signatures[members[0]] == signatures[other]) >= threshold:
+                        union(positions[members[0]], positions[other])
+    return [find(position) for position in range(len(products))]
+
+
+def patch_text(text, source_inputs, target_inputs):
+    """Rewrite a representative's section text for a variant.
+
+    A differing input value that appears verbatim in the text is swapped for
+    the variant's value. A value that doesn't appear is fine when it is a
+    variant field (size, pack, price) or only differs by size, as long as no
+    size from it shows up in the text either. Anything else returns None and
+    the section is generated normally.
+    """
+    changes = []
+    lowered = text.lower()
+    for field, old in source_inputs.items():
+        new = target_inputs.get(field)
+        if _same(old, new):
+            continue
+        old = '' if _blank(old) else str(json_default(old))
+        if _NUMBER.fullmatch(old):
+            # Bare numbers (prices) only count next to a currency marker, so MRP 5 doesn't rewrite "5 minutes"
+            pattern = re.compile(rf"({_CURRENCY}){re.escape(old)}(?!\d|\.\d)", re.IGNORECASE)
+        else:
+            pattern = re.compile(rf"()(?<!\w){re.escape(old)}(?!\w)") if old else None
+        if pattern and pattern.search(text):
+            changes.append((pattern, old, '' if _blank(new) else str(json_default(new))))
+        elif not ((field in VARIANT_FIELDS or normalize(old) == normalize(new))
+                  and not any(size in lowered for size in _SIZE.findall(old.lower()))):
+            return None
+    # Longest first, so "Serum 30 ml" is swapped before "30 ml"
+    for pattern, old, new in sorted(changes, key=lambda change: -len(change[1])):
+        text = pattern.sub(lambda match: match.group(1) + new, text)
+    return text
+
+
+def _same(a, b):
+    if _blank(a) and _blank(b):
+        return True
+    return str(json_default(a)) == str(json_default(b))
@@ -0,0 +1,163 @@
+# Structured-output prompt, schema and validation for the website sections
+import functools
+
+from prompts import fitted_inputs
+
+WEB_SECTIONS = ['web_bullets', 'web_description', 'usp', 'what_you_get', 'how_to_use', 'faqs', 'reviews']
+
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+SECTION_SCHEMAS = {
+    'web_bullets': _STRING_LIST,
+    'web_description': _STRING_LIST,
+    'usp': _STRING_LIST,
+    'what_you_get': {"type": "string"},
+    'how_to_use': _STRING_LIST,
+    'faqs': {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {"question": {"type": "string"}, "answer": {"type": "string"}},
+            "required": ["question", "answer"],
+            "additionalProperties": False,
+        },
+    },
+    'reviews': {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {"name": {"type": "string"}, "review": {"type": "string"}},
+            "required": ["name", "review"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+SECTION_INSTRUCTIONS = {
+    'web_bullets': "web_bullets – exactly 7 bullet points for website use, each focused on product benefits, customer problems, or emotional triggers.",
+    'web_description': "web_description – exactly 2 paragraphs, warm and benefit-oriented tone, max 400 words in total.",
+    'usp': "usp – exactly 6 USPs, each a short, impactful phrase of 2–4 words. No full sentences, no explanations.",
+    'what_you_get': "what_you_get – what the customer receives: packaging, quantity, and any bonuses.",
+    'how_to_use': "how_to_use – easy-to-follow, friendly, step-by-step instructions, one step per item.",
+    'faqs': (
+        "faqs – exactly 6 FAQs with answers under 150 characters. Do NOT include questions about certifications, "
+        "result timelines, or return/refund policies, or \"What is it?\" / \"How do I use it?\". Focus on practical use, "
+        "compatibility, general safety, storage, frequency, product care, and common customer concerns. "
+        "Do not mention price, promotions, or other brands."
+    ),
+    'reviews': (
+        "reviews – exactly 15 customer reviews. The first 2 are long story-style testimonials, the remaining 13 are "
+        "short and specific, each highlighting a different use case or outcome. Reviewer names should sound authentic "
+        "and be common Indian names."
+    ),
+}
+
+WEB_SECTION_TITLES = {
+    'web_bullets': "Bullet Points",
+    'web_description': "Description",
+    'usp': "USP Points",
+    'what_you_get': "What Do You Get",
+    'how_to_use': "How to Use",
+    'faqs': "FAQs",
+    'reviews': "Customer Reviews",
+}
+
+
+def response_format(sections):
+    return _response_format(tuple(sections))
+
+
+@functools.lru_cache(maxsize=None)
+def _response_format(sections):
+    # Built once per section combination; callers must not mutate the result
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "website_content",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {section: SECTION_SCHEMAS[section] for section in sections},
+                "required": list(sections),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def web_content_prompt(product_info, sections, problems=None):
+    product_info = fitted_inputs('web_full', product_info)
+    instructions = "\n".join(f"{i}. {SECTION_INSTRUCTIONS[section]}" for i, section in enumerate(sections, 1))
+    retry_note = ""
+    if problems:
+        retry_note = "\nA previous attempt was rejected:\n" + "\n".join(f"- {p}" for p in problems) + "\n"
+    return f"""
+Generate the following website content as JSON matching the given schema:
+
+{instructions}
+{retry_note}
+Product Name: {product_info['Product Name']}
+Brand: {product_info['Brand Name']}
+USPs / Features: {product_info['USPs Front']}
+Ingredients: {product_info['Ingredients']}
+Claims: {product_info['Claims']}
+How to Use: {product_info['How to use it?']}
+What’s Included: {product_info['Particulars']}
+MRP: ₹{product_info['MRP']}
+"""
+
+
+def _count(items, expected, what):
+    if len(items) != expected:
+        return f"expected exactly {expected} {what}, got {len(items)}"
+
+
+def validate_section(section, value):
+    """Return a description of what is wrong with a parsed section, or None if it is valid."""
+    if section == 'what_you_get':
+        return None if value.strip() else "what_you_get is empty"
+    if any(not (item.strip() if isinstance(item, str) else all(v.strip() for v in item.values())) for item in value):
+        return f"{section} contains empty entries"
+    if section == 'web_bullets':
+        return _count(value, 7, "bullet points")
+    if section == 'web_description':
+        if len(" ".join(value).split()) > 400:
+            return "web_description is longer than 400 words"
+        return _count(value, 2, "description paragraphs")
+    if section == 'usp':
+        problem = _count(value, 6, "USPs")
+        if problem:
+            return problem
+        long_usps = [usp for usp in value if not 2 <= len(usp.split()) <= 4]
+        if long_usps:
+            return f"USPs must be 2–4 words each: {', '.join(long_usps)}"
+    if section == 'how_to_use':
+        return None if value else "how_to_use has no steps"
+    if section == 'faqs':
+        problem = _count(value, 6, "FAQs")
+        if problem:
+            return problem
+        if any(len(faq['answer']) >= 150 for faq in value):
+            return "FAQ answers must be under 150 characters"
+    if section == 'reviews':
+        return _count(value, 15, "reviews")
+    return None
+
+
+def format_section(section, value):
+    # Render parsed JSON as the same plain text the individual section buttons produce
+    if section in ('web_bullets', 'usp'):
+        return "\n".join(f"- {item}" for item in value)
+    if section == 'web_description':
+        return "\n\n".join(value)
+    if section == 'how_to_use':
+        return "\n".join(f"{i}. {step}" for i, step in enumerate(value, 1))
+    if section == 'faqs':
+        return "\n\n".join(f"Q: {faq['question']}\nA: {faq['answer']}" for faq in value)
+    if section == 'reviews':
+        return "\n\n".join(f"{review['name']}: {review['review']}" for review in value)
+    return value.strip()
+
+
+def format_web_full(texts):
+    return "\n\n".join(f"{WEB_SECTION_TITLES[section]}\n{texts[section]}" for section in WEB_SECTIONS if section in texts)